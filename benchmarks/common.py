@@ -0,0 +1,75 @@
+import datetime
+import json
+import logging
+import math
+import pathlib
+import subprocess
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger("benchmarks")
+ROOT = pathlib.Path(__file__).parent
+RESULTS_DIR = ROOT.joinpath("results")
+
+
+def get_commit() -> tuple[str, bool]:
+    """current git commit and whether the tree has uncommitted changes"""
+    try:
+        commit = subprocess.run(
+            ["/usr/bin/env", "git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=ROOT,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["/usr/bin/env", "git", "status", "--porcelain", "--untracked=no"],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=ROOT,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def write_result(
+    kind: str, result: dict, results_dir: pathlib.Path = RESULTS_DIR
+) -> pathlib.Path:
+    """write result (with commit and date) to a JSON file named after those"""
+    commit, dirty = get_commit()
+    now = datetime.datetime.now()
+    result = {
+        "commit": commit,
+        "dirty": dirty,
+        "date": now.isoformat(timespec="seconds"),
+        **result,
+    }
+    results_dir.mkdir(parents=True, exist_ok=True)
+    fpath = results_dir.joinpath(
+        f"{kind}_{now:%Y%m%d-%H%M%S}_{commit[:8]}{'-dirty' if dirty else ''}.json"
+    )
+    with open(fpath, "w") as fh:
+        json.dump(result, fh, indent=2)
+    logger.info(f"Result written to {fpath}")
+    return fpath
+
+
+def get_exponent(timings: dict[int, float]) -> float | None:
+    """exponent of least-squares fit of time = a * size^exponent
+
+    ~1 is linear, ~2 is quadratic"""
+    points = [
+        (math.log(size), math.log(duration))
+        for size, duration in timings.items()
+        if duration > 0
+    ]
+    if len(points) < 2:  # noqa: PLR2004
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sum(
+        (x - mean_x) ** 2 for x, _ in points
+    )
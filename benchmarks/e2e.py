@@ -0,0 +1,197 @@
+"""End-to-end benchmark: runs nautiluszim over a synthetic collection
+
+Files are generated into an archive and/or served by a local HTTP stand-in
+server, then nautiluszim runs in a subprocess with --build-report.
+Results (throughput, peak memory, build report) are written as JSON to
+benchmarks/results/, named after date and commit for comparison across commits.
+
+    python -m benchmarks.e2e --items 10000 --url-ratio 0.2 --latency 0.05
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import resource
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import RESULTS_DIR, logger, write_result
+from benchmarks.server import SyntheticServer
+from benchmarks.synthetic import SIZE_DISTRIBUTIONS, CollectionSpec, generate
+
+
+def run_nautilus(
+    archive: pathlib.Path | None,
+    collection: pathlib.Path,
+    output_dir: pathlib.Path,
+    extra_args: list[str],
+) -> tuple[float, int, dict]:
+    """run nautiluszim, returning wall time, peak RSS (bytes) and build report"""
+    args = [
+        sys.executable,
+        "-m",
+        "nautiluszim.entrypoint",
+        "--collection",
+        str(collection),
+        "--name",
+        "benchmark_en_all",
+        "--zim-file",
+        "benchmark.zim",
+        "--title",
+        "Benchmark",
+        "--description",
+        "Synthetic benchmark collection",
+        "--output",
+        str(output_dir),
+        "--build-report",
+    ]
+    if archive:
+        args += ["--archive", str(archive)]
+    args += extra_args
+
+    logger.info(f"Running {shlex.join(args)}")
+    started_on = time.perf_counter()
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+    wall_time = time.perf_counter() - started_on
+    # ru_maxrss of children is the largest of all children so far (KiB on Linux)
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform != "darwin":
+        max_rss *= 2**10
+
+    with open(output_dir / "benchmark.report.json") as fh:
+        report = json.load(fh)
+    return wall_time, max_rss, report
+
+
+def get_parser() -> argparse.ArgumentParser:
+    defaults = CollectionSpec()
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.e2e",
+        description="Benchmark nautiluszim end-to-end on a synthetic collection",
+    )
+    parser.add_argument("--items", type=int, default=defaults.items)
+    parser.add_argument("--files-per-item", type=int, default=defaults.files_per_item)
+    parser.add_argument(
+        "--size-distribution",
+        choices=SIZE_DISTRIBUTIONS,
+        default=defaults.size_distribution,
+    )
+    parser.add_argument(
+        "--median-size",
+        type=int,
+        default=defaults.median_size,
+        help="Median file size in bytes",
+    )
+    parser.add_argument(
+        "--url-ratio",
+        type=float,
+        default=defaults.url_ratio,
+        help="Share of files served over HTTP (0-1). Others are in archive",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="Server latency, in seconds"
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=int,
+        default=0,
+        help="Server bandwidth per connection, in bytes/s. Unlimited otherwise",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Share of HTTP requests answered with a 503 (0-1)",
+    )
+    parser.add_argument(
+        "--nautilus-args",
+        default="",
+        help="Additional nautiluszim arguments, as a single string",
+    )
+    parser.add_argument(
+        "--results-dir",
+        type=pathlib.Path,
+        default=RESULTS_DIR,
+        help="Where to write the JSON result",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=pathlib.Path,
+        help="Where to generate collection and ZIM. Temporary folder otherwise",
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    spec = CollectionSpec(
+        items=args.items,
+        files_per_item=args.files_per_item,
+        size_distribution=args.size_distribution,
+        median_size=args.median_size,
+        url_ratio=args.url_ratio,
+        seed=args.seed,
+    )
+
+    server = SyntheticServer(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    server.start()
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp_dir:
+        work_dir = pathlib.Path(tmp_dir)
+        logger.info(f"Generating collection {spec.to_dict()}")
+        archive, collection = generate(spec, work_dir / "source", server.base_url)
+
+        wall_time, max_rss, report = run_nautilus(
+            archive,
+            collection,
+            work_dir / "output",
+            shlex.split(args.nautilus_args),
+        )
+    server.shutdown()
+
+    files_bytes = sum(
+        figures["bytes_out"]
+        for category, figures in report["categories"].items()
+        if category not in ("ui", "database")
+    )
+    result = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spec": spec.to_dict(),
+        "server": {
+            "latency": args.latency,
+            "bandwidth": args.bandwidth,
+            "error_rate": args.error_rate,
+            **server.stats(),
+        },
+        "nautilus_args": args.nautilus_args,
+        "wall_time": round(wall_time, 3),
+        "max_rss": max_rss,
+        "files": report["nb_files"],
+        "files_per_second": round(report["nb_files"] / wall_time, 3),
+        "bytes_per_second": round(files_bytes / wall_time),
+        "zim_size": report["zim_size"],
+        "report": report,
+    }
+    write_result("e2e", result, args.results_dir)
+
+    logger.info(
+        f"{result['files']} files in {result['wall_time']}s "
+        f"({result['files_per_second']} files/s, "
+        f"{result['bytes_per_second']} B/s), max RSS {max_rss} B, "
+        f"ZIM {result['zim_size']} B"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Micro-benchmarks of the scraper functions large collections spend startup in
+
+Each function is timed over synthetic inputs of increasing sizes (nb of file
+entries) and its scaling curve reported: time per size and the exponent of a
+log-log fit (~1 is linear, ~2 is quadratic). Sizes are skipped once a function
+exceeds --max-seconds so quadratic ones don't hold the whole run.
+Results are written as JSON to benchmarks/results/ like end-to-end ones.
+
+    python -m benchmarks.micro --sizes 1000,10000,100000,1000000
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import tempfile
+import time
+import zipfile
+from collections.abc import Callable
+
+from benchmarks.common import RESULTS_DIR, get_exponent, logger, write_result
+from nautiluszim.entries import normalized_path
+from nautiluszim.scraper import Nautilus
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def make_collection(size: int) -> list[dict]:
+    """collection of `size` file entries, mixing all supported file formats"""
+    collection = []
+    for index in range(size):
+        name = f"{index // 1000:04d}/{index:07d} Item é.pdf"
+        kind = index % 3
+        if kind == 0:
+            file = name
+        elif kind == 1:
+            file = {"archive-member": name, "filename": f"renamed/{name}"}
+        else:
+            file = {"url": f"http://localhost/{size}/{name}"}
+        collection.append(
+            {
+                "title": f"Item {index}",
+                "description": "Synthetic item for benchmarks",
+                "authors": "Benchmark",
+                "files": [file],
+            }
+        )
+    return collection
+
+
+def make_scraper(work_dir: pathlib.Path, collection: list[dict]) -> Nautilus:
+    """bare scraper with only the state benchmarked functions rely on
+
+    Nautilus.__init__ is bypassed as it requires a full set of arguments and
+    sets up the ZIM creator."""
+    scraper = object.__new__(Nautilus)
+    scraper.archive = None
+    scraper.collection = None
+    scraper.output_dir = work_dir
+    scraper.build_dir = work_dir.joinpath("build")
+    scraper.build_dir.mkdir(parents=True, exist_ok=True)
+    scraper.json_collection = collection
+    return scraper
+
+
+def setup_load_collection(work_dir: pathlib.Path, size: int) -> Callable:
+    scraper = make_scraper(work_dir, [])
+    scraper.collection = work_dir.joinpath("collection.json")
+    with open(scraper.collection, "w") as fh:
+        json.dump(make_collection(size), fh)
+    return scraper.load_collection
+
+
+def setup_test_files(work_dir: pathlib.Path, size: int) -> Callable:
+    collection = make_collection(size)
+    scraper = make_scraper(work_dir, collection)
+    # as done by test_archive_collection: every archive member is available
+    available = [
+        scraper.get_file_entry_from(entry["files"][0])[0] for entry in collection
+    ]
+    return lambda: scraper.test_files(available)
+
+
+def setup_get_file_entry_from(work_dir: pathlib.Path, size: int) -> Callable:
+    collection = make_collection(size)
+    scraper = make_scraper(work_dir, collection)
+
+    def run():
+        for entry in collection:
+            for file in entry["files"]:
+                normalized_path(scraper.get_file_entry_from(file)[1])
+
+    return run
+
+
+def setup_database(work_dir: pathlib.Path, size: int) -> Callable:
+    scraper = make_scraper(work_dir, make_collection(size))
+    return scraper.get_database_js
+
+
+def setup_extract_to_fs(work_dir: pathlib.Path, size: int) -> Callable:
+    scraper = make_scraper(work_dir, [])
+    scraper.archive = str(work_dir.joinpath("archive.zip"))
+    names = [f"{index // 1000:04d}/{index:07d}.txt" for index in range(size)]
+    with zipfile.ZipFile(scraper.archive_path, "w", zipfile.ZIP_STORED) as zh:
+        for name in names:
+            zh.writestr(name, name)
+
+    def run():
+        # single handle, as used by each worker when adding files
+        with scraper.open_archive() as handles:
+            zh = handles.get() if handles else None
+            for name in names:
+                scraper.extract_to_fs(name, handle=zh)
+
+    return run
+
+
+BENCHMARKS: dict[str, Callable[[pathlib.Path, int], Callable]] = {
+    "load_collection": setup_load_collection,
+    "test_files": setup_test_files,
+    "get_file_entry_from": setup_get_file_entry_from,
+    "database": setup_database,
+    "extract_to_fs": setup_extract_to_fs,
+}
+
+
+def run_benchmark(
+    name: str, sizes: list[int], repeat: int, max_seconds: float
+) -> dict[int, float]:
+    """best time of `repeat` runs of benchmark `name` for each size"""
+    timings = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            func = BENCHMARKS[name](pathlib.Path(tmp_dir), size)
+            durations = []
+            for _ in range(repeat):
+                started_on = time.perf_counter()
+                func()
+                durations.append(time.perf_counter() - started_on)
+        timings[size] = min(durations)
+        logger.info(f"{name} ({size} entries): {timings[size]:.4f}s")
+        if timings[size] > max_seconds:
+            logger.warning(f"{name} over {max_seconds}s, skipping larger sizes")
+            break
+    return timings
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.micro",
+        description="Benchmark scraper functions over growing collections",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=list(DEFAULT_SIZES),
+        help="Comma-separated nb of file entries to benchmark with",
+    )
+    parser.add_argument(
+        "--only",
+        choices=BENCHMARKS,
+        action="append",
+        help="Only run this benchmark. Can be repeated",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Nb of runs per size. Best time is kept",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=60,
+        help="Skip larger sizes once a run of a benchmark takes longer than this",
+    )
+    parser.add_argument(
+        "--results-dir",
+        type=pathlib.Path,
+        default=RESULTS_DIR,
+        help="Where to write the JSON result",
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    sizes = sorted(args.sizes)
+
+    benchmarks = {}
+    for name in args.only or BENCHMARKS:
+        timings = run_benchmark(name, sizes, args.repeat, args.max_seconds)
+        exponent = get_exponent(timings)
+        benchmarks[name] = {
+            "timings": {
+                str(size): round(duration, 6) for size, duration in timings.items()
+            },
+            "per_entry": {
+                str(size): round(duration / size, 9)
+                for size, duration in timings.items()
+            },
+            "exponent": round(exponent, 2) if exponent is not None else None,
+        }
+
+    write_result(
+        "micro",
+        {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": args.repeat,
+            "benchmarks": benchmarks,
+        },
+        args.results_dir,
+    )
+
+    logger.info(f"{'benchmark':<20}" + "".join(f"{size:>12}" for size in sizes))
+    for name, result in benchmarks.items():
+        logger.info(
+            f"{name:<20}"
+            + "".join(
+                f"{result['timings'].get(str(size), float('nan')):>12.4f}"
+                for size in sizes
+            )
+            + f"  exponent: {result['exponent']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
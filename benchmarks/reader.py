@@ -0,0 +1,154 @@
+"""Reader UI benchmark: database import, first page, search and memory in Node
+
+database.js files are generated the way the scraper does (get_database_js) for
+growing numbers of items, then benchmarks/reader/bench.js loads each into the
+reader (nautilus.js and its vendors, in jsdom with an in-memory IndexedDB).
+
+Requires the reader vendors (downloaded on project install/build) and the
+harness' Node dependencies, installed once with:
+
+    npm install --prefix benchmarks/reader
+
+After which it runs offline:
+
+    python -m benchmarks.reader --sizes 1000,10000,100000
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import shutil
+import subprocess
+import tempfile
+
+from benchmarks.common import RESULTS_DIR, get_exponent, logger, write_result
+from benchmarks.micro import make_collection, make_scraper
+from nautiluszim.constants import ROOT_DIR
+
+HARNESS_DIR = pathlib.Path(__file__).parent.joinpath("reader")
+TEMPLATES_DIR = ROOT_DIR.joinpath("templates")
+DEFAULT_SIZES = (1000, 10000, 100000)
+# search is a regex on title and author: many matches, a single one, none
+QUERIES = ("Item 1", "^Item 7$", "nomatch")
+
+
+def check_requirements(node: str):
+    """exit with an explanation if the harness can't run"""
+    if not shutil.which(node):
+        raise SystemExit(f"Node not found: {node}")
+    if not TEMPLATES_DIR.joinpath("vendors", "pouchdb.min.js").exists():
+        raise SystemExit(
+            f"Reader vendors missing in {TEMPLATES_DIR}/vendors. "
+            "Install the project first (pip install -e .)"
+        )
+    if not HARNESS_DIR.joinpath("node_modules").exists():
+        raise SystemExit(
+            f"Harness dependencies missing. Run: npm install --prefix {HARNESS_DIR}"
+        )
+
+
+def run_reader(node: str, database: pathlib.Path) -> dict:
+    """figures of bench.js for a database.js file"""
+    process = subprocess.run(
+        [
+            node,
+            "--expose-gc",
+            str(HARNESS_DIR.joinpath("bench.js")),
+            str(TEMPLATES_DIR),
+            str(database),
+            *QUERIES,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(process.stdout)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.reader",
+        description="Benchmark the reader UI over growing databases",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=list(DEFAULT_SIZES),
+        help="Comma-separated nb of items to benchmark with",
+    )
+    parser.add_argument("--node", default="node", help="Node executable")
+    parser.add_argument(
+        "--results-dir",
+        type=pathlib.Path,
+        default=RESULTS_DIR,
+        help="Where to write the JSON result",
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    check_requirements(args.node)
+    sizes = sorted(args.sizes)
+
+    runs = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = pathlib.Path(tmp_dir)
+        for size in sizes:
+            database = work_dir.joinpath("database.js")
+            scraper = make_scraper(work_dir, make_collection(size))
+            database.write_text(scraper.get_database_js())
+            try:
+                runs[size] = run_reader(args.node, database)
+            except subprocess.CalledProcessError as exc:
+                raise SystemExit(f"Reader benchmark failed:\n{exc.stderr}") from exc
+            logger.info(f"{size} items: {runs[size]}")
+
+    exponents = {
+        key: get_exponent({size: run[key] for size, run in runs.items()})
+        for key in ("import_time", "first_page_time")
+    }
+    exponents.update(
+        {
+            f"search:{query}": get_exponent(
+                {size: run["search"][query] for size, run in runs.items()}
+            )
+            for query in QUERIES
+        }
+    )
+
+    write_result(
+        "reader",
+        {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "node": subprocess.run(
+                [args.node, "--version"], capture_output=True, text=True, check=True
+            ).stdout.strip(),
+            "sizes": sizes,
+            "queries": QUERIES,
+            "runs": {str(size): run for size, run in runs.items()},
+            "exponents": {
+                key: round(value, 2) if value is not None else None
+                for key, value in exponents.items()
+            },
+        },
+        args.results_dir,
+    )
+
+    logger.info(
+        f"{'items':>10}{'import':>10}{'1st page':>10}"
+        + "".join(f"{query[:10]:>12}" for query in QUERIES)
+        + f"{'heap':>14}"
+    )
+    for size, run in runs.items():
+        logger.info(
+            f"{size:>10}{run['import_time']:>10.3f}{run['first_page_time']:>10.3f}"
+            + "".join(f"{run['search'][query]:>12.3f}" for query in QUERIES)
+            + f"{run['heap_used']:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+/*
+  Headless benchmark of the reader UI
+
+  Runs nautilus.js (and its vendors, as downloaded by the build) in jsdom with an
+  in-memory IndexedDB (fake-indexeddb) and times, for a given database.js:
+    - import: from init_database() to on_database_ready (bulkDocs + info)
+    - first_page: from on_database_ready to first displayRows
+    - search: per query, from search() to displayRows or no-result
+  then reports memory. Prints a single JSON object on stdout.
+
+  Meant to be driven by benchmarks/reader.py:
+    node --expose-gc bench.js <templates_dir> <database.js> [query…]
+*/
+
+const fs = require("fs");
+const path = require("path");
+const { performance } = require("perf_hooks");
+const { JSDOM } = require("jsdom");
+const fakeIndexedDB = require("fake-indexeddb");
+
+const [templatesDir, databasePath, ...queries] = process.argv.slice(2);
+if (!templatesDir || !databasePath) {
+  console.error("usage: bench.js <templates_dir> <database.js> [query…]");
+  process.exit(2);
+}
+
+const SCRIPTS = [
+  "vendors/pouchdb.min.js",
+  "vendors/pouchdb.find.min.js",
+  "vendors/jquery.min.js",
+  "vendors/handlebars.runtime.min-v4.7.7.js",
+  "precompiled.js",
+  "vendors/sugar.min.js",
+  "nautilus.js",
+];
+
+// scroll and media player are out of scope: chainable no-op stand-ins
+function ScrollMagicStub() {
+  const scene = {addTo: () => scene, on: () => scene, update: () => scene};
+  return {Controller: function () {}, Scene: function () { return scene; }};
+}
+
+// resolves on first call to any of obj's methods (which are then restored)
+function nextCall(obj, methods) {
+  return new Promise((resolve) => {
+    const originals = {};
+    methods.forEach((method) => {
+      originals[method] = obj[method];
+      obj[method] = function (...args) {
+        Object.assign(obj, originals);
+        const result = originals[method].apply(this, args);
+        resolve(method);
+        return result;
+      };
+    });
+  });
+}
+
+function memoryUsage() {
+  if (global.gc)
+    global.gc();
+  const usage = process.memoryUsage();
+  return {heap_used: usage.heapUsed, rss: usage.rss};
+}
+
+async function main() {
+  const dom = new JSDOM(
+    fs.readFileSync(path.join(templatesDir, "home.html"), "utf-8"),
+    {runScripts: "outside-only", url: "http://localhost/"});
+  const window = dom.window;
+  Object.assign(window, fakeIndexedDB, {ScrollMagic: ScrollMagicStub()});
+  SCRIPTS.forEach((script) => {
+    window.eval(fs.readFileSync(path.join(templatesDir, script), "utf-8"));
+  });
+
+  const nautilus = new window.Nautilus({database_name: "benchmark"});
+  // database.js is read from disk instead of a <script> tag
+  nautilus.loadScript = function (src, callback) {
+    window.eval(fs.readFileSync(databasePath, "utf-8"));
+    callback();
+  };
+  const before = memoryUsage();
+
+  const ready = nextCall(nautilus, ["on_database_ready"]);
+  const rendered = nextCall(nautilus, ["displayRows"]);
+  let started_on = performance.now();
+  nautilus.init_database();
+  await ready;
+  const import_time = performance.now() - started_on;
+  started_on = performance.now();
+  await rendered;
+  const first_page_time = performance.now() - started_on;
+  const after = memoryUsage();
+
+  const search = {};
+  for (const query of queries) {
+    const done = nextCall(nautilus, ["displayRows", "on_no_search_result"]);
+    started_on = performance.now();
+    nautilus.search(query);
+    await done;
+    search[query] = (performance.now() - started_on) / 1000;
+  }
+
+  process.stdout.write(JSON.stringify({
+    items: nautilus.doc_count,
+    import_time: import_time / 1000,
+    first_page_time: first_page_time / 1000,
+    search: search,
+    heap_used: after.heap_used,
+    heap_growth: after.heap_used - before.heap_used,
+    rss: after.rss,
+  }) + "\n");
+  window.close();
+}
+
+main().catch((err) => {
+  console.error(err);
+  process.exit(1);
+});
@@ -0,0 +1,127 @@
+"""HTTP stand-in server for benchmarks, serving synthetic files
+
+URLs are /<size>/<name>. Latency, bandwidth and error rate are configurable
+to mimic remote hosts. Range requests are supported (single range)."""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import iter_content
+
+RANGE_RE = re.compile(r"bytes=(?P<start>\d+)-(?P<end>\d*)$")
+
+
+class SyntheticServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int] = ("127.0.0.1", 0),
+        *,
+        latency: float = 0,
+        bandwidth: int = 0,
+        error_rate: float = 0,
+        seed: int = 42,
+    ):
+        super().__init__(address, SyntheticHandler)
+        self.latency = latency  # seconds before each response
+        self.bandwidth = bandwidth  # bytes per second per connection. 0: unlimited
+        self.error_rate = error_rate  # share of requests answered with a 503
+        self.rng = random.Random(seed)  # noqa: S311
+        self.nb_requests = self.nb_errors = self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.nb_requests += 1
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.nb_errors += 1
+                return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.nb_requests,
+            "errors": self.nb_errors,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+class SyntheticHandler(BaseHTTPRequestHandler):
+    server: SyntheticServer  # pyright: ignore [reportIncompatibleVariableOverride]
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002, ARG002
+        return
+
+    def do_HEAD(self):  # noqa: N802
+        self.respond(with_body=False)
+
+    def do_GET(self):  # noqa: N802
+        self.respond(with_body=True)
+
+    def respond(self, *, with_body: bool):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        match = re.match(r"^/(?P<size>\d+)/(?P<name>.+)$", self.path)
+        if not match:
+            self.send_error(404)
+            return
+        if self.server.should_fail():
+            self.send_error(503)
+            return
+
+        size, name = int(match.group("size")), match.group("name")
+        start, end = 0, size - 1
+        range_match = RANGE_RE.match(self.headers.get("Range", ""))
+        if range_match:
+            start = int(range_match.group("start"))
+            end = min(int(range_match.group("end") or end), end)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        etag = hashlib.sha256(f"{size}/{name}".encode()).hexdigest()[:16]
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{etag}"')
+        self.end_headers()
+        if not with_body:
+            return
+
+        remaining = end - start + 1
+        for chunk in iter_content(name, size, start):
+            chunk = chunk[:remaining]  # noqa: PLW2901
+            try:
+                self.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            remaining -= len(chunk)
+            with self.server.lock:
+                self.server.bytes_sent += len(chunk)
+            if self.server.bandwidth:
+                time.sleep(len(chunk) / self.server.bandwidth)
+            if remaining <= 0:
+                break
@@ -0,0 +1,122 @@
+"""Synthetic collections for benchmarks
+
+Content is derived from the file name (and chunk index) only so the same file can
+be generated in the archive, served over HTTP (with Range support) and checked
+without being stored anywhere."""
+
+import json
+import math
+import pathlib
+import random
+import zipfile
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+
+CHUNK_SIZE = 2**16
+MAX_SIZE = 2**30
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis "
+    "nostrud exercitation ullamco laboris nisi aliquip ex ea commodo consequat"
+).split()
+SIZE_DISTRIBUTIONS = ("fixed", "lognormal", "mixed")
+
+
+@dataclass
+class CollectionSpec:
+    """parameters of a synthetic collection"""
+
+    items: int = 1000
+    files_per_item: int = 1
+    # fixed: all files are median_size
+    # lognormal: sizes around median_size, sigma=1
+    # mixed: 80% text around median/8, 15% documents around median, 5% videos
+    size_distribution: str = "mixed"
+    median_size: int = 64 * 2**10
+    url_ratio: float = 0.0  # share of files served over HTTP instead of archive
+    seed: int = 42
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def iter_content(name: str, size: int, start: int = 0) -> Iterator[bytes]:
+    """content of synthetic file `name` of `size` bytes, from offset `start`
+
+    .txt files are pseudo-text (compressible), others are random bytes"""
+    index, offset = divmod(start, CHUNK_SIZE)
+    while index * CHUNK_SIZE < size:
+        rng = random.Random(f"{name}:{index}")  # noqa: S311
+        length = min(CHUNK_SIZE, size - index * CHUNK_SIZE)
+        if name.endswith(".txt"):
+            text = " ".join(rng.choices(WORDS, k=length // 4 + 1)).encode("ASCII")
+            chunk = text[:length].ljust(length, b".")
+        else:
+            chunk = rng.randbytes(length)
+        yield chunk[offset:]
+        offset = 0
+        index += 1
+
+
+def pick_file(rng: random.Random, spec: CollectionSpec) -> tuple[str, int]:
+    """extension and size of a new file, following spec's distribution"""
+    median = spec.median_size
+    if spec.size_distribution == "fixed":
+        return "bin", median
+    if spec.size_distribution == "lognormal":
+        return "bin", min(int(rng.lognormvariate(math.log(median), 1)), MAX_SIZE)
+    kind = rng.random()
+    if kind < 0.8:  # noqa: PLR2004
+        ext, median = "txt", max(median // 8, 1)
+    elif kind < 0.95:  # noqa: PLR2004
+        ext = "pdf"
+    else:
+        ext, median = "webm", median * 64
+    return ext, min(int(rng.lognormvariate(math.log(median), 0.5)), MAX_SIZE)
+
+
+def generate(
+    spec: CollectionSpec, dest: pathlib.Path, base_url: str
+) -> tuple[pathlib.Path | None, pathlib.Path]:
+    """write archive (if any file is in archive) and collection JSON to dest
+
+    URL files are expected to be served by benchmarks.server at base_url"""
+    if spec.size_distribution not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f"Unknown size distribution: {spec.size_distribution}")
+    rng = random.Random(spec.seed)  # noqa: S311
+    dest.mkdir(parents=True, exist_ok=True)
+    archive_path = dest / "archive.zip"
+    collection_path = dest / "collection.json"
+
+    collection = []
+    in_archive = 0
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as zh:
+        for index in range(spec.items):
+            files = []
+            for findex in range(spec.files_per_item):
+                ext, size = pick_file(rng, spec)
+                name = f"{index // 1000:04d}/{index:07d}-{findex}.{ext}"
+                if rng.random() < spec.url_ratio:
+                    files.append({"url": f"{base_url}/{size}/{name}", "filename": name})
+                    continue
+                with zh.open(name, "w") as fh:
+                    for chunk in iter_content(name, size):
+                        fh.write(chunk)
+                files.append(name)
+                in_archive += 1
+            collection.append(
+                {
+                    "title": f"Item {index}",
+                    "description": " ".join(rng.choices(WORDS, k=12)),
+                    "authors": rng.choice(WORDS).title(),
+                    "files": files,
+                }
+            )
+
+    with open(collection_path, "w") as fh:
+        json.dump(collection, fh)
+
+    if not in_archive:
+        archive_path.unlink()
+        return None, collection_path
+    return archive_path, collection_path
@@ -3,11 +3,14 @@
 # vim: ai ts=4 sts=4 et sw=4 nu
 
 import json
+import logging
 import os
 import pathlib
 import re
+import shutil
 import subprocess
 import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 
 import gdown
@@ -16,9 +19,20 @@ from slugify import slugify
 from zimscraperlib.video.encoding import reencode
 from zimscraperlib.video.presets import VideoWebmHigh
 
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 DATA_DIR = pathlib.Path("data").resolve()
-FILENAMES_MAP_PATH = pathlib.Path("filenames.map")
+# journal of google drive ID -> filename in data dir, appended to
+FILENAMES_MAP_PATH = pathlib.Path("filenames.map.jsonl")
+# former map, a JSON object rewritten on each update
+LEGACY_FILENAMES_MAP_PATH = pathlib.Path("filenames.map")
 FILENAMES_MAP = {}
+# concurrent downloads and reencodes (ffmpeg being multi-threaded itself)
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+REENCODE_WORKERS = int(
+    os.getenv("REENCODE_WORKERS", max(1, (os.cpu_count() or 1) // 2))
+)
 
 
 @contextmanager
@@ -31,63 +45,154 @@ def cwd(path):
         os.chdir(oldpwd)
 
 
+def load_map():
+    filenames_map = {}
+    if LEGACY_FILENAMES_MAP_PATH.exists():
+        with open(LEGACY_FILENAMES_MAP_PATH) as fh:
+            filenames_map.update(json.load(fh))
+    if FILENAMES_MAP_PATH.exists():
+        with open(FILENAMES_MAP_PATH) as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # interrupted write
+                filenames_map[record["gid"]] = record["fname"]
+    return filenames_map
+
+
 def update_map(gid, fname):
     FILENAMES_MAP[gid] = fname
-    with open(FILENAMES_MAP_PATH, "w") as fh:
-        json.dump(FILENAMES_MAP, fh, indent=4)
+    with open(FILENAMES_MAP_PATH, "a") as fh:
+        fh.write(json.dumps({"gid": gid, "fname": fname}) + "\n")
+
+
+def download(gid, data_dir):
+    """download google drive file to its own temp folder in data_dir"""
+    tmp_dir = data_dir / f".{gid}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+    fpath = gdown.download(
+        f"https://drive.google.com/uc?id={gid}", output=f"{tmp_dir}/", quiet=True
+    )
+    if not fpath:
+        raise OSError("download failed")
+    return pathlib.Path(fpath)
+
+
+def reencode_to_webm(src_path, fpath):
+    """reencode downloaded video to fpath, removing its temp folder"""
+    if not reencode(src_path, fpath, VideoWebmHigh().to_ffmpeg_args()):
+        raise OSError("ffmpeg failed")
+    shutil.rmtree(src_path.parent, ignore_errors=True)
+    return fpath
+
+
+def get_webm_name(src_path, gid, taken):
+    """webm filename for downloaded src_path, suffixed with gid if taken
+
+    Drive files of different IDs may share a name (or a stem)"""
+    fname = f"{src_path.stem}.webm"
+    if fname in taken:
+        fname = f"{src_path.stem}_{gid}.webm"
+    return fname
+
+
+def fetch_all(gids, data_dir, *, overwrite=False):
+    """filename in data_dir of each google drive ID that could be fetched
+
+    Downloads and reencodes run in their own pools: each file is reencoded as
+    soon as it's downloaded while next ones download. Downloads pause while
+    too many files wait for reencoding, bounding disk usage."""
+    fnames = {}
+    to_fetch = []
+    for gid in dict.fromkeys(gids):
+        fname = FILENAMES_MAP.get(gid)
+        if fname and (data_dir / fname).exists() and not overwrite:
+            logger.info(f"  Skipping download of {gid}")
+            fnames[gid] = fname
+        else:
+            to_fetch.append(gid)
+
+    # files of other IDs in data_dir, which reencodes must not overwrite
+    refetched = {FILENAMES_MAP.get(gid) for gid in to_fetch}
+    taken = {
+        fpath.name for fpath in data_dir.glob("*.webm") if fpath.name not in refetched
+    }
+    gids_iter = iter(to_fetch)
+    pending = {}
+    with ThreadPoolExecutor(DOWNLOAD_WORKERS) as downloads_pool:
+        with ThreadPoolExecutor(REENCODE_WORKERS) as reencodes_pool:
+            while True:
+                nb_downloads = sum(step == "download" for _, step in pending.values())
+                while (
+                    nb_downloads < DOWNLOAD_WORKERS
+                    and len(pending) < DOWNLOAD_WORKERS + REENCODE_WORKERS * 2
+                ):
+                    gid = next(gids_iter, None)
+                    if gid is None:
+                        break
+                    future = downloads_pool.submit(download, gid, data_dir)
+                    pending[future] = (gid, "download")
+                    nb_downloads += 1
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    gid, step = pending.pop(future)
+                    try:
+                        fpath = future.result()
+                    except Exception as exc:
+                        logger.warning(f"  Failed to {step} {gid}: {exc}")
+                        continue
+                    if step == "download":
+                        logger.info(f"  Downloaded {fpath.name}")
+                        fname = get_webm_name(fpath, gid, taken)
+                        taken.add(fname)
+                        reencoding = reencodes_pool.submit(
+                            reencode_to_webm, fpath, data_dir / fname
+                        )
+                        pending[reencoding] = (gid, "reencode")
+                    else:
+                        logger.info(f"  Reencoded {fpath.name}")
+                        update_map(gid, fpath.name)
+                        fnames[gid] = fpath.name
+    return fnames
 
 
 def create_collection_for(ws, overwrite=False):
     name = slugify(ws.title)
-    print(f"{ws.title} -> {name}")
+    logger.info(f"{ws.title} -> {name}")
 
     data_dir = DATA_DIR / name
     data_dir.mkdir(exist_ok=True)
 
-    items = []
-
+    rows = []
     for c_title, c_desc, c_auth, c_url in ws.iter_rows(min_row=2, max_col=4):
         if c_title.value is None:
             break
 
-        print(c_title.value)
-
         # retrieve google drive ID from field
         # in-doc url fmt: https://docs.google.com/uc?id=[FILE_ID]&export=download
         # actual url fmt: https://drive.google.com/file/d/<id>/view?usp=sharing
         gid = re.search(r"([a-zA-Z0-9\_\-]+)/view", c_url.value).groups()[-1]
+        rows.append((c_title.value, c_desc.value, c_auth.value, gid))
 
-        # retrieve expected filename from map
-        fname = FILENAMES_MAP.get(gid)
-        fpath = data_dir / fname if fname else None
-        # download if we dont already have it
-        if not fname or (fpath and not fpath.exists()) or overwrite:
-            fpath = pathlib.Path(
-                gdown.download(
-                    f"https://drive.google.com/uc?id={gid}", output=f"{data_dir}/"
-                )
-            )
-            orig_fpath = data_dir / fpath.relative_to(data_dir).name
-            fpath = orig_fpath.with_suffix(".webm")
-            # reencode video to webm
-            reencode(
-                orig_fpath,
-                fpath,
-                VideoWebmHigh().to_ffmpeg_args(),
-                delete_src=True,
-            )
-
-            update_map(gid, fpath.relative_to(data_dir).name)
-        else:
-            print("  Skipping download")
+    fnames = fetch_all([row[3] for row in rows], data_dir, overwrite=overwrite)
 
-        # update collection
+    # update collection, in sheet order
+    items = []
+    for title, description, authors, gid in rows:
+        if gid not in fnames:
+            logger.warning(f"  Missing file for {title}, not in collection")
+            continue
         items.append(
             {
-                "title": c_title.value,
-                "description": c_desc.value,
-                "authors": c_auth.value,
-                "files": [str(fpath.name)],
+                "title": title,
+                "description": description,
+                "authors": authors,
+                "files": [fnames[gid]],
             }
         )
 
@@ -107,25 +212,32 @@ def create_collection_for(ws, overwrite=False):
                 "-T",
                 f"{zip_path.resolve()}",
                 "collection.json",
-            ] + [f.name for f in data_dir.iterdir()]
+            ] + [
+                # not temp folders of failed downloads
+                f.name
+                for f in data_dir.iterdir()
+                if not f.name.startswith(".")
+            ]
             subprocess.run(args)
 
 
 def convert(path):
     global FILENAMES_MAP
-    print(f"Working off {path}")
+    logger.info(f"Working off {path}")
 
     # create data-dir if it doesn't exist
     DATA_DIR.mkdir(exist_ok=True)
 
     # load filenames map if it exists
-    if FILENAMES_MAP_PATH.exists():
-        with open(FILENAMES_MAP_PATH, "r") as fh:
-            FILENAMES_MAP = json.load(fh)
+    FILENAMES_MAP = load_map()
 
-    wb = load_workbook(filename=str(path))
-    for name in wb.sheetnames:
-        create_collection_for(wb[name])
+    # streams rows instead of loading the whole workbook in memory
+    wb = load_workbook(filename=str(path), read_only=True)
+    try:
+        for name in wb.sheetnames:
+            create_collection_for(wb[name])
+    finally:
+        wb.close()
 
 
 if __name__ == "__main__":
@@ -3,13 +3,22 @@
 # vim: ai ts=4 sts=4 et sw=4 nu
 
 import argparse
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import json
 import logging
 import os
 import pathlib
 import pprint
+import re
 import shutil
 import subprocess
 import sys
+import tempfile
+import time
 import zipfile
 
 import humanfriendly
@@ -50,6 +59,63 @@ VIDEO_EXTENTIONS = (
     "3gp",
 )
 AUDIO_EXTENSIONS = ("ogg", "mp3", "aif", "mpa", "wav", "wma", "aiff")
+# external tools used per target (EPUB recompresses its images and mp3)
+TOOLS = {
+    VIDEO: ("ffmpeg",),
+    AUDIO: ("ffmpeg",),
+    JPEG: ("jpegoptim", "identify"),
+    PNG: ("pngquant", "identify"),
+    EPUB: ("jpegoptim", "pngquant", "ffmpeg"),
+}
+# EPUB members recompressed (in parallel) and their presets, per EPUB preset
+EPUB_MEDIA_EXTENSIONS = (".png", ".jpeg", ".jpg", ".mp3")
+EPUB_MEDIA_PRESETS = {"default": {AUDIO: "mp3-48k", JPEG: "low", PNG: "low"}}
+# nb of members recompressed at once (unless given threads)
+EPUB_WORKERS = int(os.getenv("EPUB_WORKERS", min(4, os.cpu_count() or 1)))
+# EPUB members that wouldn't gain from deflate
+EPUB_STORED_EXTENSIONS = (
+    *EPUB_MEDIA_EXTENSIONS,
+    ".gif",
+    ".webp",
+    ".ogg",
+    ".m4a",
+    ".mp4",
+    ".webm",
+    ".woff",
+    ".woff2",
+    ".zip",
+)
+# limits of each preset's output. A source within those (and of the same
+# format) is kept as is. Bitrates include audio, tolerance applies to numbers
+PRESET_LIMITS = {
+    VIDEO: {
+        "240p": {"video_codec": "vp8", "height": 240, "bit_rate": 176_000},
+        "360p": {"video_codec": "vp8", "height": 360, "bit_rate": 240_000},
+        "360p+": {"video_codec": "vp8", "height": 360, "bit_rate": 432_000},
+        "yt2z": {"video_codec": "vp8", "width": 480, "bit_rate": 428_000},
+    },
+    AUDIO: {
+        "ogg-48k": {"audio_codec": "vorbis", "bit_rate": 48_000},
+        "mp3-48k": {"audio_codec": "mp3", "bit_rate": 48_000},
+    },
+    JPEG: {
+        "low": {"quality": 25},
+        "medium": {"quality": 50},
+        "high": {"quality": 75},
+    },
+    PNG: {
+        "low": {"palette": True},
+        "medium": {"palette": True},
+        "high": {"palette": True},
+    },
+}
+LIMITS_TOLERANCE = 0.1
+# limits of those types must be matched exactly, not just not exceeded
+EXACT_LIMITS = (bool, str)
+# a previous result is reused if all those match
+CACHE_KEYS = ("src_sha256", "target", "preset", "tools")
+# journal states of a source
+IN_FLIGHT, DONE, FAILED = "in-flight", "done", "failed"
 
 
 def hsize(size):
@@ -61,8 +127,209 @@ def run_args(args):
     return subprocess.run(args, capture_output=True, text=True)
 
 
+def get_encode_stats(ps, duration):
+    """frames encoded by ffmpeg (from its last progress line) and rate"""
+    frames = re.findall(r"frame=\s*(\d+)", ps.stderr or "")
+    nb_frames = int(frames[-1]) if frames else 0
+    return {"frames": nb_frames, "fps": nb_frames / duration if duration else 0}
+
+
+def probe_media(target, fpath):
+    """properties of a media file compared to preset limits ({} if unknown)"""
+    try:
+        if target in (VIDEO, AUDIO):
+            return probe_audio_video(fpath)
+        if target in (JPEG, PNG):
+            return probe_image(fpath)
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning(f"Unable to probe {fpath}: {exc}")
+    return {}
+
+
+def probe_audio_video(fpath):
+    ps = run_args(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            f"file:{fpath}",
+        ]
+    )
+    if ps.returncode != 0:
+        return {}
+    data = json.loads(ps.stdout)
+    probe = {"bit_rate": int(data["format"].get("bit_rate") or 0) or None}
+    for stream in data.get("streams", []):
+        kind = stream.get("codec_type")
+        if kind not in ("video", "audio") or f"{kind}_codec" in probe:
+            continue
+        probe[f"{kind}_codec"] = stream.get("codec_name")
+        if kind == "video":
+            probe.update(width=stream.get("width"), height=stream.get("height"))
+    return probe
+
+
+def probe_image(fpath):
+    # %Q is ImageMagick's quality *estimate* from quantization tables: encoders
+    # with custom tables may be under-estimated and kept at a higher quality
+    ps = run_args(["identify", "-format", "%Q %[type]", f"{fpath}[0]"])
+    if ps.returncode != 0:
+        return {}
+    quality, image_type = ps.stdout.split()[:2]
+    return {"quality": int(quality), "palette": image_type.startswith("Palette")}
+
+
+def meets_preset(target, preset, probe):
+    """whether probed source is already within preset's limits"""
+    limits = PRESET_LIMITS.get(target, {}).get(preset)
+    if not limits or not probe:
+        return False
+    for key, limit in limits.items():
+        value = probe.get(key)
+        if value is None:
+            return False
+        if isinstance(limit, EXACT_LIMITS):
+            if value != limit:
+                return False
+        elif value > limit * (1 + LIMITS_TOLERANCE):
+            return False
+    return True
+
+
+def file_sha256(fpath):
+    digest = hashlib.sha256()
+    with open(fpath, "rb") as fh:
+        for chunk in iter(lambda: fh.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@functools.lru_cache
+def get_tool_version(tool):
+    """first line of tool's version output (None if not installed)"""
+    try:
+        flag = "-version" if tool in ("ffmpeg", "qpdf", "identify") else "--version"
+        ps = run_args([tool, flag])
+    except OSError:
+        return None
+    output = (ps.stdout or ps.stderr).strip()
+    return output.splitlines()[0] if output else None
+
+
+def get_tools_version(target, preset):
+    if target == PDF:
+        tools = ("gs",) if preset.startswith("gs-") else ("qpdf",)
+    else:
+        tools = TOOLS.get(target, ())
+    return " | ".join(f"{tool} {get_tool_version(tool)}" for tool in tools)
+
+
+@contextlib.contextmanager
+def partial_output(dst_path):
+    """path to write dst_path to, in a private folder removed on exit
+
+    Caller moves it to dst_path once complete so dst_path is either the previous
+    or the complete new output, never a partial one. A leftover of an
+    interrupted run is removed first: partial outputs are never trusted."""
+    partial_dir = dst_path.parent.joinpath(f".{dst_path.name}.partial")
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    partial_dir.mkdir(parents=True)
+    try:
+        yield partial_dir.joinpath(dst_path.name)
+    finally:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+
+
+def is_partial_dir(path):
+    return path.name.startswith(".") and path.name.endswith(".partial")
+
+
+class RecompressCache:
+    """Journal and results of recompressions, by source path
+
+    A JSON-lines file appended to as files are started and recompressed, last
+    line for a source winning. Full records hold source fingerprint (size,
+    mtime, sha256), target, preset and tools versions along with destination
+    path and size. State lines record sources in-flight and failed so an
+    interrupted run knows what it was doing."""
+
+    def __init__(self, fpath):
+        self.fpath = pathlib.Path(fpath)
+        # successful results
+        self.records = {}
+        # last known state of each source
+        self.states = {}
+        if not self.fpath.exists():
+            return
+        with open(self.fpath) as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # interrupted write
+                state = record.get("state", DONE)
+                self.states[record["src"]] = state
+                if "dst" in record:
+                    self.records[record["src"]] = record
+
+    def get(self, src_path):
+        return self.records.get(str(src_path), {})
+
+    def get_state(self, src_path):
+        return self.states.get(str(src_path))
+
+    def get_sources(self, state):
+        return [src for src, src_state in self.states.items() if src_state == state]
+
+    def write(self, line):
+        self.fpath.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.fpath, "a") as fh:
+            fh.write(json.dumps(line) + "\n")
+
+    def add(self, record):
+        record = {**record, "state": DONE}
+        self.records[record["src"]] = record
+        self.states[record["src"]] = DONE
+        self.write(record)
+
+    def mark(self, src_path, state):
+        """record state of src_path (without result)"""
+        self.states[str(src_path)] = state
+        self.write({"src": str(src_path), "state": state})
+
+    def finish(self, src_path, returncode, record):
+        """record outcome of src_path's recompression"""
+        if returncode == 0 and record:
+            self.add(record)
+        else:
+            self.mark(src_path, DONE if returncode == 0 else FAILED)
+
+    def compact(self):
+        """rewrite journal with a single line per source"""
+        tmp_path = self.fpath.with_name(f"{self.fpath.name}.tmp")
+        with open(tmp_path, "w") as fh:
+            for src, state in self.states.items():
+                line = self.records.get(src) if state == DONE else None
+                fh.write(json.dumps(line or {"src": src, "state": state}) + "\n")
+        os.replace(tmp_path, self.fpath)
+
+
 class Compressor:
-    def __init__(self, src_path, dst_path, keep_ext, fallback, force, presets):
+    def __init__(
+        self,
+        src_path,
+        dst_path,
+        keep_ext,
+        fallback,
+        force,
+        presets,
+        previous=None,
+        threads=None,
+    ):
         self.src_path = src_path
         self.dst_path = dst_path
         self.keep_ext = keep_ext
@@ -70,40 +337,95 @@ class Compressor:
         self.force = force
         # custom presets
         self.presets = presets
+        # cache record of previous run for src_path (None if not using cache)
+        self.previous = previous
+        # cache record of this run, once recompressed
+        self.record = None
+        # threads of ffmpeg encodes (video, audio)
+        self.threads = threads
+        # encoding stats of this run (video)
+        self.stats = {}
 
     @staticmethod
-    def recompress_epub(src_path, dst_path, preset):
-        # exract epub to temp location
-        epub_dir = dst_path.parent.joinpath(f"{dst_path.name}.folder")
-        if epub_dir.exists():
-            shutil.rmtree(epub_dir, ignore_errors=True)
-
-        # compress all files inside that tree
-        zipped_files = []
-        with zipfile.ZipFile(f"{src_path}", "r") as zf:
-            zipped_files = zf.namelist()
-            zf.extractall(epub_dir)
-
-        # loop through all files to recompress
-        for fname in zipped_files:
-            fpath = epub_dir.joinpath(fname)
-            if fpath.suffix.lower() in (".png", ".jpeg", ".jpg", ".mp3"):
+    def recompress_epub_member(zf, info, work_dir, presets):
+        """recompressed content of an EPUB's media member
+
+        Tools work on files so the member is written to its own temp folder,
+        holding only that member while it's being recompressed"""
+        with tempfile.TemporaryDirectory(dir=work_dir) as member_dir:
+            fpath = pathlib.Path(member_dir).joinpath(
+                pathlib.PurePosixPath(info.filename).name
+            )
+            with zf.open(info) as src, open(fpath, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            try:
+                # keeps member as is if it wouldn't gain
                 Compressor(
                     fpath,
                     fpath,
                     keep_ext=True,
                     fallback=FALLBACK_COPY,
                     force=True,
-                    presets={AUDIO: "mp3-48k", JPEG: "low", PNG: "low"},
+                    presets=presets,
+                    # members are recompressed in parallel, one core each
+                    threads=1,
                 ).run()
+            except Exception as exc:
+                # missing or failing tool: keep member rather than fail the EPUB
+                logger.warning(f"Unable to recompress {info.filename}: {exc}")
+                return zf.read(info)
+            return fpath.read_bytes()
+
+    @staticmethod
+    def recompress_epub(src_path, dst_path, preset, threads=None):
+        """rewrite EPUB member by member, recompressing media ones in parallel
 
-        # recreate epub file
-        with zipfile.ZipFile(f"{dst_path}", "w", zipfile.ZIP_DEFLATED) as zf:
-            for fpath in zipped_files:
-                zf.write(epub_dir.joinpath(fpath), fpath)
+        Members keep their order, `mimetype` first and uncompressed as required
+        by OCF. Already compressed members (images, audio, fonts) are STORED.
+        Media members are recompressed by `threads` (EPUB_WORKERS) at once."""
+        presets = EPUB_MEDIA_PRESETS[preset]
+        workers = threads or EPUB_WORKERS
+        with contextlib.ExitStack() as stack:
+            src_zf = stack.enter_context(zipfile.ZipFile(src_path, "r"))
+            dst_zf = stack.enter_context(zipfile.ZipFile(dst_path, "w"))
+            work_dir = stack.enter_context(
+                tempfile.TemporaryDirectory(dir=dst_path.parent)
+            )
+            executor = stack.enter_context(
+                concurrent.futures.ThreadPoolExecutor(workers)
+            )
 
-        # delete temp folder
-        shutil.rmtree(epub_dir, ignore_errors=True)
+            def write_member(info, future):
+                dst_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                dst_info.external_attr = info.external_attr
+                if info.filename == "mimetype" or info.filename.lower().endswith(
+                    EPUB_STORED_EXTENSIONS
+                ):
+                    dst_info.compress_type = zipfile.ZIP_STORED
+                else:
+                    dst_info.compress_type = zipfile.ZIP_DEFLATED
+                content = future.result() if future else src_zf.read(info)
+                dst_zf.writestr(dst_info, content)
+
+            # recompress a few media members ahead of the one being written
+            pending = collections.deque()
+            for info in sorted(
+                src_zf.infolist(), key=lambda info: info.filename != "mimetype"
+            ):
+                future = None
+                if info.filename.lower().endswith(EPUB_MEDIA_EXTENSIONS):
+                    future = executor.submit(
+                        Compressor.recompress_epub_member,
+                        src_zf,
+                        info,
+                        work_dir,
+                        presets,
+                    )
+                pending.append((info, future))
+                if len(pending) > workers * 2:
+                    write_member(*pending.popleft())
+            while pending:
+                write_member(*pending.popleft())
 
         return subprocess.CompletedProcess(args=[], returncode=0, stdout="")
 
@@ -121,7 +443,12 @@ class Compressor:
             f"--max={quality}",
             f"{src_path}",
         ]
-        return run_args(args)
+        ps = run_args(args)
+        # jpegoptim keeps source's filename in --dest
+        output_path = dst_path.parent.joinpath(src_path.name)
+        if ps.returncode == 0 and output_path != dst_path:
+            output_path.replace(dst_path)
+        return ps
 
     @staticmethod
     def recompress_png(src_path, dst_path, preset):
@@ -139,13 +466,7 @@ class Compressor:
         return run_args(args)
 
     @staticmethod
-    def recompress_audio(src_path, dst_path, preset):
-        final_dst_path = None
-        if src_path == dst_path:
-            final_dst_path = pathlib.Path(dst_path)
-            dst_path = dst_path.parent.joinpath(
-                f"{dst_path.stem}.temp{dst_path.suffix}"
-            )
+    def recompress_audio(src_path, dst_path, preset, threads=None):
         presets = {
             "ogg-48k": [
                 "-codec:a",
@@ -171,16 +492,14 @@ class Compressor:
 
         args = ["ffmpeg", "-y", "-i", f"file:{src_path}", "-vn"]
         args += presets[preset]
+        if threads:
+            args += ["-threads", f"{threads}"]
         args += [f"file:{dst_path}"]
 
-        ffmpeg = run_args(args)
-        if dst_path.exists() and final_dst_path:
-            dst_path.replace(final_dst_path)
-
-        return ffmpeg
+        return run_args(args)
 
     @staticmethod
-    def recompress_video(src_path, dst_path, preset):
+    def recompress_video(src_path, dst_path, preset, threads=None):
         video_format = "webm"
         video_codecs = {"mp4": "h264", "webm": "libvpx"}
         audio_codecs = {"mp4": "aac", "webm": "libvorbis"}
@@ -214,9 +533,6 @@ class Compressor:
                 # of the output bitrate
                 "-bufsize",
                 "1000k",
-                # nb of threads to use
-                "-threads",
-                "8",
                 # change output video dimensions
                 "-vf",
                 "scale='480:trunc(ow/a/2)*2'",
@@ -317,6 +633,9 @@ class Compressor:
         args += presets[preset]
         args += params[video_format]
         args += ["-max_muxing_queue_size", "9999"]
+        # nb of threads to use (ffmpeg picks from nb of cores otherwise)
+        if threads:
+            args += ["-threads", f"{threads}"]
         args += [f"file:{dst_path}"]
 
         return run_args(args)
@@ -357,7 +676,9 @@ class Compressor:
     @staticmethod
     def copy_source_to_dest(src_path, dst_path):
         if src_path != dst_path:
-            shutil.copyfile(src_path, dst_path)
+            with partial_output(dst_path) as partial_path:
+                shutil.copyfile(src_path, partial_path)
+                partial_path.replace(dst_path)
 
     def get_target_for(self, fpath):
         ext = fpath.suffix.lower()[1:]
@@ -389,6 +710,57 @@ class Compressor:
 
         return target, preset, dst_ext
 
+    def get_record(self, target, preset):
+        """cache record of source and settings, without destination yet"""
+        stat = self.src_path.stat()
+        previous = self.previous or {}
+        # don't hash again a source that doesn't seem to have changed
+        if (previous.get("src_size"), previous.get("src_mtime")) == (
+            stat.st_size,
+            stat.st_mtime,
+        ) and previous.get("src_sha256"):
+            src_sha256 = previous["src_sha256"]
+        else:
+            src_sha256 = file_sha256(self.src_path)
+        record = {
+            "src": str(self.src_path),
+            "src_size": stat.st_size,
+            "src_mtime": stat.st_mtime,
+            "src_sha256": src_sha256,
+            "target": target,
+            "preset": preset,
+            "tools": get_tools_version(target, preset),
+        }
+        # media properties don't depend on settings: probed once per content
+        if previous.get("probe") is not None and previous["src_sha256"] == src_sha256:
+            record["probe"] = previous["probe"]
+        return record
+
+    def get_probe(self, target, record):
+        """media properties of source (None if not relevant for target)"""
+        if target not in PRESET_LIMITS:
+            return None
+        if record and "probe" in record:
+            return record["probe"]
+        probe = probe_media(target, self.src_path)
+        if record is not None:
+            record["probe"] = probe
+        return probe
+
+    def matches_previous(self, record):
+        return bool(self.previous) and all(
+            self.previous.get(key) == record[key] for key in CACHE_KEYS
+        )
+
+    def is_up_to_date(self, record):
+        """whether destination holds the previous result for same source/settings"""
+        return (
+            self.matches_previous(record)
+            and self.previous.get("dst") == str(self.dst_path)
+            and self.dst_path.exists()
+            and self.dst_path.stat().st_size == self.previous.get("dst_size")
+        )
+
     def run(self):
         # use fname from source if not full path supplied
         if self.dst_path.is_dir() or not self.dst_path.suffix:
@@ -416,56 +788,116 @@ class Compressor:
                 f"{self.dst_path.stem}.{new_ext}"
             )
 
+        record = None
+        if self.previous is not None:
+            # skip if cache says destination is result of same source and settings
+            record = self.get_record(target, preset)
+            if not self.force and self.is_up_to_date(record):
+                logger.info(f"Skipping {self.src_path} (recompressed previously)")
+                self.record = self.previous
+                return 0
+            # no need to try again if source was kept (no gain) last time
+            if (
+                not self.force
+                and self.matches_previous(record)
+                and self.previous.get("kept_source")
+            ):
+                logger.info(f"NOT re-compressing {self.src_path} (no gain)")
+                self.copy_source_to_dest(self.src_path, self.dst_path)
+                self.record = {
+                    **record,
+                    "dst": str(self.dst_path),
+                    "dst_size": record["src_size"],
+                    "gain": False,
+                    "kept_source": True,
+                }
+                return 0
         # skip if destination already exists
-        if self.src_path != self.dst_path and self.dst_path.exists() and not self.force:
+        elif (
+            self.src_path != self.dst_path and self.dst_path.exists() and not self.force
+        ):
             logger.info("Skipping (destination exists)")
             return 0
 
+        # no need to recompress a source already within preset's limits
+        if (
+            not self.force
+            and self.src_path.suffix.lower() == self.dst_path.suffix.lower()
+            and meets_preset(target, preset, self.get_probe(target, record))
+        ):
+            logger.info(f"NOT re-compressing {self.src_path} (already meets {preset})")
+            self.copy_source_to_dest(self.src_path, self.dst_path)
+            if record:
+                self.record = {
+                    **record,
+                    "dst": str(self.dst_path),
+                    "dst_size": record["src_size"],
+                    "gain": False,
+                    "kept_source": True,
+                }
+            return 0
+
         logger.info(
             f"re-compressing {preset.upper()}: {self.src_path} -> {self.dst_path}"
         )
 
         src_size = self.src_path.stat().st_size
-        ps = getattr(self, f"recompress_{target}")(self.src_path, self.dst_path, preset)
-        if ps.returncode == 0:
-            dst_size = self.dst_path.stat().st_size
+        with partial_output(self.dst_path) as partial_path:
+            started_on = time.monotonic()
+            if target in (VIDEO, AUDIO, EPUB):
+                ps = getattr(self, f"recompress_{target}")(
+                    self.src_path, partial_path, preset, threads=self.threads
+                )
+            else:
+                ps = getattr(self, f"recompress_{target}")(
+                    self.src_path, partial_path, preset
+                )
+            if target == VIDEO:
+                self.stats = get_encode_stats(ps, time.monotonic() - started_on)
+                self.stats["threads"] = self.threads
+                logger.info(f"{self.src_path}: encoded at {self.stats['fps']:.1f} fps")
+            if ps.returncode != 0:
+                logger.error(f"Failed to recompress:\n{ps.stdout}")
+                return ps.returncode
+
+            dst_size = partial_path.stat().st_size
             diff_size = (1 - (dst_size / src_size)) * 100
             logger.info(
                 f"{self.src_path}: {hsize(src_size)} -> {hsize(dst_size)} "
                 f"({diff_size:.1f}%)"
             )
-            return 0
-
-        logger.error(f"Failed to recompress:\n{ps.stdout}")
-        return ps.returncode
+            gain = dst_size < src_size
+            # keep source if it's smaller, unless we're changing format
+            kept_source = not gain and self.src_path.suffix == self.dst_path.suffix
+            if kept_source:
+                logger.info(f"No gain, keeping {self.src_path} as is")
+                self.copy_source_to_dest(self.src_path, self.dst_path)
+                dst_size = src_size
+            else:
+                partial_path.replace(self.dst_path)
 
+        if record:
+            self.record = {
+                **record,
+                "dst": str(self.dst_path),
+                "dst_size": dst_size,
+                "gain": gain,
+                "kept_source": kept_source,
+            }
+            if self.src_path == self.dst_path:
+                # in place: recompressed file is the source from now on
+                if not kept_source:
+                    self.record.pop("probe", None)
+                self.record.update(
+                    src_size=dst_size,
+                    src_mtime=self.dst_path.stat().st_mtime,
+                    src_sha256=file_sha256(self.dst_path),
+                )
+        return 0
 
-def main():
-    parser = argparse.ArgumentParser(
-        prog="nautilus file recompressor",
-        description="recompress a file for smaller size use in nautilus",
-        epilog=f"Available presets:\n {pprint.pformat(ALL_PRESETS)}",
-    )
 
-    parser.add_argument(
-        "--src",
-        help="Source file path",
-        required=True,
-        dest="src_path",
-    )
-    parser.add_argument(
-        "--dst",
-        help="Destination file path. If a folder, --src's fname will be appended",
-        required=False,
-        dest="dst_path",
-    )
-    parser.add_argument(
-        "--in-place",
-        help="Recompress source file directly",
-        action="store_true",
-        default=False,
-        dest="in_place",
-    )
+def add_compressor_arguments(parser):
+    """Compressor options, shared with recompress_tree's --compress-args"""
     parser.add_argument(
         "--fallback",
         help="Keep source file extension for target if not specified",
@@ -498,6 +930,61 @@ def main():
             default=PRESETS[key],
         )
 
+
+def get_compressor_kwargs(args):
+    """Compressor keyword arguments from parsed compressor options"""
+    return {
+        "keep_ext": args.keep_ext,
+        "fallback": args.fallback,
+        "force": args.force,
+        "presets": {key: getattr(args, f"{key}_preset") for key in PRESETS.keys()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="nautilus file recompressor",
+        description="recompress a file for smaller size use in nautilus",
+        epilog=f"Available presets:\n {pprint.pformat(ALL_PRESETS)}",
+    )
+
+    parser.add_argument(
+        "--src",
+        help="Source file path",
+        required=True,
+        dest="src_path",
+    )
+    parser.add_argument(
+        "--dst",
+        help="Destination file path. If a folder, --src's fname will be appended",
+        required=False,
+        dest="dst_path",
+    )
+    parser.add_argument(
+        "--in-place",
+        help="Recompress source file directly",
+        action="store_true",
+        default=False,
+        dest="in_place",
+    )
+    add_compressor_arguments(parser)
+    parser.add_argument(
+        "--cache",
+        help="Path to a recompression cache (JSON lines). Previous result is "
+        "reused if source, preset and tools didn't change. Created if missing",
+        required=False,
+        dest="cache",
+    )
+    parser.add_argument(
+        "--threads",
+        help="Number of threads of video and audio encodes, and of EPUB members "
+        "recompressed at once. Defaults to ffmpeg's choice (based on nb of CPUs) "
+        "and EPUB_WORKERS",
+        type=int,
+        required=False,
+        dest="threads",
+    )
+
     parser.add_argument(
         "--debug",
         help="display debug message on error",
@@ -520,18 +1007,20 @@ def main():
         if not args.dst_path:
             raise ValueError("Must have either --dst or --in-place")
 
-        # update presets value based on args
-        presets = {key: getattr(args, f"{key}_preset") for key in PRESETS.keys()}
-
+        cache = RecompressCache(args.cache) if args.cache else None
         compressor = Compressor(
             args.src_path,
             args.dst_path,
-            keep_ext=args.keep_ext,
-            fallback=args.fallback,
-            force=args.force,
-            presets=presets,
+            **get_compressor_kwargs(args),
+            previous=cache.get(args.src_path) if cache else None,
+            threads=args.threads,
         )
-        sys.exit(compressor.run())
+        if cache:
+            cache.mark(args.src_path, IN_FLIGHT)
+        returncode = compressor.run()
+        if cache:
+            cache.finish(args.src_path, returncode, compressor.record)
+        sys.exit(returncode)
     except Exception as exc:
         logger.error(f"FAILED. An error occurred: {exc}")
         if args.debug:
@@ -2,59 +2,510 @@
 # -*- coding: utf-8 -*-
 # vim: ai ts=4 sts=4 et sw=4 nu
 
+from __future__ import annotations
+
 import argparse
+import collections
+import concurrent.futures
+import itertools
 import logging
+import os
 import pathlib
-import subprocess
+import shutil
 import sys
+import tempfile
+import time
+from dataclasses import dataclass
 
 import humanfriendly
+from recompress_file import (
+    ALL_PRESETS,
+    AUDIO,
+    EPUB,
+    EPUB_WORKERS,
+    FAILED,
+    IN_FLIGHT,
+    JPEG,
+    PDF,
+    PNG,
+    VIDEO,
+    Compressor,
+    RecompressCache,
+    add_compressor_arguments,
+    get_compressor_kwargs,
+    is_partial_dir,
+)
 
 logging.basicConfig(level=logging.DEBUG, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
-ROOT = pathlib.Path(__file__).parent
-
-
-def disk_usage(folder):
-    return sum(file.stat().st_size for file in folder.glob("**/*"))
+CACHE_NAME = ".recompress-cache.jsonl"
+# relative CPU cost of recompressing a byte of each type, for scheduling
+COST_WEIGHTS = {VIDEO: 100, AUDIO: 20, PDF: 10, EPUB: 5, JPEG: 2, PNG: 2, None: 0.1}
+# seconds between progress logs
+PROGRESS_INTERVAL = 10
+# files per type recompressed with each preset to plan for a --budget
+SAMPLE_SIZE = 5
+# threads per video encode. libvpx's VP8 hardly scales further at our output
+# sizes: more concurrent encodes use cores better than more threads per encode
+VIDEO_THREADS = 4
+# memory used by a video encode, bounding concurrent ones
+VIDEO_JOB_MEMORY = 2**29
 
 
 def hsize(size):
     return humanfriendly.format_size(size, binary=True)
 
 
+def get_cpu_count():
+    """CPUs we may run on (affinity or container's cpuset)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_available_memory():
+    """bytes of memory available to new processes (None if unknown)
+
+    Lowest of system's available memory and container's (cgroup v2) limit"""
+    available = []
+    try:
+        with open("/proc/meminfo") as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    available.append(int(line.split()[1]) * 2**10)
+    except OSError:
+        pass
+    try:
+        with open("/sys/fs/cgroup/memory.max") as fh:
+            limit = fh.read().strip()
+        with open("/sys/fs/cgroup/memory.current") as fh:
+            if limit.isdigit():
+                available.append(int(limit) - int(fh.read().strip()))
+    except (OSError, ValueError):
+        pass
+    return min(available) if available else None
+
+
+def parse_compress_args(compress_args):
+    """Compressor keyword arguments from recompress_file options"""
+    parser = argparse.ArgumentParser(prog="--compress-args", add_help=False)
+    add_compressor_arguments(parser)
+    return get_compressor_kwargs(parser.parse_args(compress_args.split()))
+
+
+def handle_file(src_path, dst_path, compressor_kwargs, previous):
+    """recompress a single file (in a worker process)
+
+    Returns return code, duration, cache record (if recompressed), size of
+    destination (0 if there's none) and encoding stats (video)"""
+    started_on = time.monotonic()
+    compressor = Compressor(src_path, dst_path, **compressor_kwargs, previous=previous)
+    try:
+        returncode = compressor.run()
+    except Exception as exc:
+        logger.error(f"Failed to recompress {src_path}: {exc}")
+        returncode = 1
+    if compressor.record:
+        dst_size = compressor.record["dst_size"]
+    else:
+        try:
+            dst_size = compressor.dst_path.stat().st_size
+        except OSError:
+            dst_size = 0
+    duration = time.monotonic() - started_on
+    return returncode, duration, compressor.record, dst_size, compressor.stats
+
+
+def estimate_file(src_path, work_dir, compressor_kwargs, target, preset):
+    """size of src_path once recompressed with preset (None if it failed)"""
+    dst_dir = pathlib.Path(tempfile.mkdtemp(dir=work_dir))
+    presets = {**compressor_kwargs["presets"], target: preset}
+    compressor = Compressor(
+        src_path,
+        dst_dir,
+        **{**compressor_kwargs, "force": True, "presets": presets, "threads": 1},
+    )
+    try:
+        if compressor.run() == 0:
+            return compressor.dst_path.stat().st_size
+    except Exception as exc:
+        logger.error(f"Failed to recompress {src_path} with {preset}: {exc}")
+    finally:
+        shutil.rmtree(dst_dir, ignore_errors=True)
+    return None
+
+
+class JobSlots:
+    """CPU cores (and memory, for videos) shared by concurrent jobs
+
+    Jobs take as many cores as their encoder uses threads: video_threads for
+    videos, EPUB_WORKERS for EPUBs and a single one for other files. Concurrent
+    videos are also bounded by available memory.
+    While videos are waiting for a slot, cores are kept for them so that
+    lighter jobs don't starve them."""
+
+    def __init__(self, cores, video_threads=VIDEO_THREADS, memory=None):
+        self.cores = cores
+        self.video_threads = max(1, min(video_threads, cores))
+        self.video_slots = max(1, cores // self.video_threads)
+        if memory is not None:
+            self.video_slots = max(1, min(self.video_slots, memory // VIDEO_JOB_MEMORY))
+        self.used = 0
+        self.videos = 0
+
+    def get_threads(self, target):
+        if target == VIDEO:
+            return self.video_threads
+        if target == EPUB:
+            return max(1, min(EPUB_WORKERS, self.cores))
+        return 1
+
+    def fits(self, target, videos_waiting=0):
+        threads = self.get_threads(target)
+        if target == VIDEO:
+            return self.videos < self.video_slots and (
+                not self.used or self.used + threads <= self.cores
+            )
+        reserved = self.video_threads * min(
+            videos_waiting, self.video_slots - self.videos
+        )
+        return not self.used or self.used + threads <= self.cores - reserved
+
+    def take(self, target):
+        threads = self.get_threads(target)
+        self.used += threads
+        self.videos += target == VIDEO
+        return threads
+
+    def release(self, target):
+        self.used -= self.get_threads(target)
+        self.videos -= target == VIDEO
+
+
+@dataclass
+class ManifestFile:
+    """A source file found while scanning the tree"""
+
+    src_path: pathlib.Path
+    size: int
+    target: str | None  # type it's recompressed as (None if not recognized)
+    cost: float  # scheduling weight: size, weighted by target's cost
+    dst_size: int | None = None  # once handled
+
+
+class Manifest:
+    """Source files with their size and target, from a single scan of the tree
+
+    Used for scheduling, progress and the final report. Destination size of
+    each file is filled as it is handled."""
+
+    def __init__(self, files: list[ManifestFile]):
+        self.files = files
+        self.total_cost = sum(item.cost for item in files)
+        self.done_cost = 0
+        self.done = 0
+        self.started_on = time.monotonic()
+        self.logged_on = self.started_on
+        # stats of video encodes
+        self.encodes = []
+
+    def __len__(self):
+        return len(self.files)
+
+    def set_done(self, item, dst_size, stats=None):
+        item.dst_size = dst_size
+        self.done += 1
+        self.done_cost += item.cost
+        if stats and stats.get("frames"):
+            self.encodes.append(stats)
+
+    def log_progress(self, *, force=False):
+        now = time.monotonic()
+        if not force and now - self.logged_on < PROGRESS_INTERVAL:
+            return
+        self.logged_on = now
+        ratio = self.done_cost / self.total_cost if self.total_cost else 1
+        eta = ""
+        if 0 < ratio < 1:
+            remaining = (now - self.started_on) * (1 - ratio) / ratio
+            eta = f", ETA {humanfriendly.format_timespan(remaining, max_units=2)}"
+        logger.info(f"Progress: {self.done}/{len(self)} files ({ratio:.1%}{eta})")
+
+    def get_report(self):
+        """before/after sizes per target type"""
+        types = {}
+        for item in self.files:
+            stats = types.setdefault(item.target or "other", [0, 0, 0])
+            stats[0] += 1
+            stats[1] += item.size
+            stats[2] += item.dst_size or 0
+        types["total"] = [
+            sum(stats[index] for stats in types.values()) for index in range(3)
+        ]
+        lines = []
+        for name, (nb, size, dst_size) in types.items():
+            diff = (1 - dst_size / size) * 100 if size else 0
+            lines.append(
+                f"{name:>6}: {nb} file(s), {hsize(size)} -> {hsize(dst_size)} "
+                f"({diff:.1f}%)"
+            )
+        if self.encodes:
+            duration = time.monotonic() - self.started_on
+            frames = sum(stats["frames"] for stats in self.encodes)
+            fps = sum(stats["fps"] for stats in self.encodes) / len(self.encodes)
+            threads = sorted({stats["threads"] for stats in self.encodes})
+            lines.append(
+                f"{len(self.encodes)} video encode(s) at {fps:.1f} fps on average "
+                f"({'/'.join(map(str, threads))} threads each), "
+                f"{frames / duration:.1f} fps overall"
+            )
+        return "\n".join(lines)
+
+
 class TexasRanger:
-    def __init__(self, src_path, dst_path, compress_args, force):
+    def __init__(
+        self,
+        src_path,
+        dst_path,
+        compress_args,
+        force,
+        *,
+        jobs=None,
+        cache_path=None,
+        skip_failed=False,
+        budget=None,
+        sample_size=SAMPLE_SIZE,
+        plan_only=False,
+        video_threads=VIDEO_THREADS,
+    ):
         self.src_path = src_path
         self.dst_path = dst_path
-        self.compress_args = compress_args.split()
-        self.force = force
-
-    def handle_file(self, src_path, dst_path):
-        logger.info(f"{src_path} -> {dst_path}")
-        args = [
-            str(ROOT / "recompress_file.py"),
-            "--src",
-            str(src_path),
-            "--dst",
-            str(dst_path),
-        ] + self.compress_args
-        ps = subprocess.run(args, capture_output=True, text=True)
-        if ps.returncode != 0:
-            raise IOError(ps.stdout)
+        self.cache = RecompressCache(cache_path) if cache_path else None
+        self.skip_failed = skip_failed
+        self.budget = budget
+        self.sample_size = sample_size
+        self.plan_only = plan_only
+        self.compressor_kwargs = parse_compress_args(compress_args)
+        self.compressor_kwargs["force"] |= force
+        # nb of cores to use
+        self.jobs = jobs or get_cpu_count()
+        self.video_threads = video_threads
+        # only used to find each file's target type
+        self.planner = Compressor(None, None, **self.compressor_kwargs)
 
     def traverse_tree(self, path):
-        for item in path.iterdir():
-            if item.is_dir():
-                self.traverse_tree(item)
-            else:
-                self.handle_file(item, self.dst_path / item.relative_to(self.src_path))
+        """(path, size) of all files in tree"""
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    # output being written (in place) or left by interrupted run
+                    if not is_partial_dir(pathlib.Path(entry.path)):
+                        yield from self.traverse_tree(entry.path)
+                elif not self.cache or entry.path != str(self.cache.fpath):
+                    yield pathlib.Path(entry.path), entry.stat().st_size
+
+    def scan(self):
+        """manifest of files to recompress, in a single walk of source tree"""
+        files = []
+        skipped = 0
+        for fpath, size in self.traverse_tree(self.src_path):
+            if (
+                self.cache
+                and self.skip_failed
+                and self.cache.get_state(fpath) == FAILED
+            ):
+                skipped += 1
+                continue
+            target = self.planner.get_target_for(fpath)[0]
+            cost = size * COST_WEIGHTS.get(target, COST_WEIGHTS[None])
+            files.append(ManifestFile(fpath, size, target, cost))
+        if skipped:
+            logger.info(f"Skipping {skipped} file(s) which failed previously")
+        return Manifest(files)
+
+    def get_samples(self, files):
+        """up to sample_size files spread over the range of sizes"""
+        files = sorted(files, key=lambda item: item.size)
+        if len(files) <= self.sample_size:
+            return files
+        step = (len(files) - 1) / (self.sample_size - 1) if self.sample_size > 1 else 0
+        return [files[round(index * step)] for index in range(self.sample_size)]
+
+    def estimate_ratios(self, manifest):
+        """output/input size ratio of each preset per type, from samples"""
+        by_target = {}
+        for item in manifest.files:
+            if item.target:
+                by_target.setdefault(item.target, []).append(item)
+        jobs = []
+        for target, files in by_target.items():
+            for item in self.get_samples(files):
+                for preset in ALL_PRESETS[target]:
+                    jobs.append((target, preset, item.src_path, item.size))
+        logger.info(f"Planning: {len(jobs)} sample recompression(s)")
+
+        # (target, preset): [sampled bytes, recompressed bytes]
+        sizes = {}
+        self.dst_path.mkdir(parents=True, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=".recompress-plan-", dir=self.dst_path)
+        try:
+            with concurrent.futures.ProcessPoolExecutor(self.jobs) as executor:
+                futures = {
+                    executor.submit(
+                        estimate_file,
+                        src_path,
+                        work_dir,
+                        self.compressor_kwargs,
+                        target,
+                        preset,
+                    ): (target, preset, size)
+                    for target, preset, src_path, size in jobs
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    target, preset, size = futures[future]
+                    dst_size = future.result()
+                    # preset failing (tool missing?) isn't a candidate
+                    if dst_size is not None:
+                        totals = sizes.setdefault((target, preset), [0, 0])
+                        totals[0] += size
+                        totals[1] += dst_size
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        ratios = {}
+        for (target, preset), totals in sizes.items():
+            if totals[0]:
+                ratios.setdefault(target, {})[preset] = totals[1] / totals[0]
+        return ratios
+
+    def plan_presets(self, manifest):
+        """presets per type keeping the most bytes (quality) within budget
+
+        Each type's total size is estimated with each preset's sampled ratio
+        and all combinations are tried (there are a few hundreds at most).
+        Returns the largest estimated mix not exceeding budget, or the smallest
+        one if none does."""
+        ratios = self.estimate_ratios(manifest)
+        type_sizes = {}
+        for item in manifest.files:
+            type_sizes[item.target] = type_sizes.get(item.target, 0) + item.size
+        # types we can't estimate are counted as is
+        fixed = sum(size for target, size in type_sizes.items() if target not in ratios)
+        targets = sorted(ratios)
+        for target in targets:
+            for preset, ratio in sorted(ratios[target].items(), key=lambda x: -x[1]):
+                logger.info(
+                    f"  {target} {preset}: {hsize(type_sizes[target])} -> "
+                    f"~{hsize(type_sizes[target] * ratio)}"
+                )
+
+        mixes = []
+        choices = [
+            [(target, preset) for preset in ratios[target]] for target in targets
+        ]
+        for mix in itertools.product(*choices):
+            total = fixed + sum(
+                type_sizes[target] * ratios[target][preset] for target, preset in mix
+            )
+            mixes.append((total, dict(mix)))
+        fitting = [mix for mix in mixes if mix[0] <= self.budget]
+        if fitting:
+            total, presets = max(fitting, key=lambda mix: mix[0])
+        else:
+            total, presets = min(mixes, key=lambda mix: mix[0], default=(fixed, {}))
+            logger.warning(f"No presets fit in {hsize(self.budget)}, using smallest")
+        logger.info(
+            f"Planned presets for ~{hsize(total)} (budget {hsize(self.budget)}): "
+            + ", ".join(f"{target}={preset}" for target, preset in presets.items())
+        )
+        return presets
+
+    def recompress_all(self, manifest):
+        """recompress files over a pool of worker processes
+
+        Costliest files (videos, large ones) go first so that lighter ones fill
+        the gaps at the end instead of one long encode running alone. Jobs are
+        started as long as there are cores for them (see JobSlots).
+        Returns paths of files that failed"""
+        files = sorted(manifest.files, key=lambda item: item.cost, reverse=True)
+        videos = collections.deque(item for item in files if item.target == VIDEO)
+        others = collections.deque(item for item in files if item.target != VIDEO)
+        slots = JobSlots(self.jobs, self.video_threads, get_available_memory())
+        logger.info(
+            f"Using {slots.cores} cores: up to {slots.video_slots} video encode(s) "
+            f"of {slots.video_threads} threads, EPUBs {slots.get_threads(EPUB)}, "
+            "other files one core each"
+        )
+        failed = []
+        with concurrent.futures.ProcessPoolExecutor(self.jobs) as executor:
+            pending = {}
+            while True:
+                # start as many jobs as there are free cores for
+                for queue in (videos, others):
+                    while queue and slots.fits(queue[0].target, len(videos)):
+                        item = queue.popleft()
+                        src_path = item.src_path
+                        dst_path = self.dst_path / src_path.relative_to(self.src_path)
+                        if self.cache:
+                            self.cache.mark(src_path, IN_FLIGHT)
+                        future = executor.submit(
+                            handle_file,
+                            src_path,
+                            dst_path,
+                            {
+                                **self.compressor_kwargs,
+                                "threads": slots.take(item.target),
+                            },
+                            self.cache.get(src_path) if self.cache else None,
+                        )
+                        pending[future] = item
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    item = pending.pop(future)
+                    slots.release(item.target)
+                    src_path = item.src_path
+                    returncode, duration, record, dst_size, stats = future.result()
+                    if returncode != 0:
+                        failed.append(src_path)
+                    if self.cache:
+                        self.cache.finish(src_path, returncode, record)
+                    manifest.set_done(item, dst_size, stats)
+                    logger.debug(f"{src_path} done in {duration:.1f}s")
+                manifest.log_progress()
+        manifest.log_progress(force=True)
+        return failed
 
     def run(self):
-        src_size = disk_usage(self.src_path)
-        self.traverse_tree(self.src_path)
-        dst_size = disk_usage(self.dst_path)
-        print("done", hsize(src_size), "->", hsize(dst_size))
+        if self.cache:
+            interrupted = self.cache.get_sources(IN_FLIGHT)
+            if interrupted:
+                logger.info(
+                    f"Resuming interrupted run: {len(interrupted)} file(s) "
+                    "were in-flight and will be recompressed again"
+                )
+        manifest = self.scan()
+        logger.info(f"Found {len(manifest)} file(s) to process")
+        if self.budget:
+            # also updates planner's (same dict)
+            self.compressor_kwargs["presets"].update(self.plan_presets(manifest))
+            if self.plan_only:
+                return 0
+        failed = self.recompress_all(manifest)
+        if self.cache:
+            self.cache.compact()
+        print(manifest.get_report())
+        if failed:
+            logger.error(
+                f"{len(failed)} file(s) failed to recompress:\n"
+                + "\n".join(f" - {fpath}" for fpath in failed)
+            )
+            return 1
+        return 0
 
 
 def main():
@@ -95,6 +546,68 @@ def main():
         default=False,
         dest="force",
     )
+    parser.add_argument(
+        "--cache",
+        help="Path to the recompression cache, allowing to reuse previous results "
+        "for unchanged sources and settings. Defaults to .recompress-cache.jsonl "
+        "in destination",
+        required=False,
+        dest="cache_path",
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="Don't use (nor update) the recompression cache",
+        action="store_true",
+        default=False,
+        dest="no_cache",
+    )
+    parser.add_argument(
+        "--skip-failed",
+        help="Don't try again files which failed in previous run (from the cache)",
+        action="store_true",
+        default=False,
+        dest="skip_failed",
+    )
+    parser.add_argument(
+        "--jobs",
+        help="Number of CPU cores to use. Files are recompressed in parallel, "
+        "each taking one core except videos (--video-threads) and EPUBs "
+        "(EPUB_WORKERS). Defaults to nb of CPUs available",
+        type=int,
+        required=False,
+        dest="jobs",
+    )
+    parser.add_argument(
+        "--video-threads",
+        help="Number of threads per video encode. Concurrent encodes are then "
+        f"bounded by cores and memory. Defaults to {VIDEO_THREADS}",
+        type=int,
+        default=VIDEO_THREADS,
+        dest="video_threads",
+    )
+    parser.add_argument(
+        "--budget",
+        help="Total size to fit in (ie. 3.5GiB). Presets are then chosen per type "
+        "by recompressing samples with each preset",
+        type=humanfriendly.parse_size,
+        required=False,
+        dest="budget",
+    )
+    parser.add_argument(
+        "--sample",
+        help=f"Number of files per type to sample for --budget. Defaults to "
+        f"{SAMPLE_SIZE}",
+        type=int,
+        default=SAMPLE_SIZE,
+        dest="sample_size",
+    )
+    parser.add_argument(
+        "--plan-only",
+        help="Only display presets chosen for --budget",
+        action="store_true",
+        default=False,
+        dest="plan_only",
+    )
 
     parser.add_argument(
         "--debug",
@@ -118,12 +631,27 @@ def main():
         if not args.dst_path:
             raise ValueError("Must have either --dst or --in-place")
 
+        cache_path = None
+        if not args.no_cache:
+            cache_path = (
+                pathlib.Path(args.cache_path).expanduser().resolve()
+                if args.cache_path
+                else args.dst_path / CACHE_NAME
+            )
+
         # update presets value based on args
         walker = TexasRanger(
             args.src_path,
             args.dst_path,
             compress_args=args.compress_args,
             force=args.force,
+            jobs=args.jobs,
+            cache_path=cache_path,
+            skip_failed=args.skip_failed,
+            budget=args.budget,
+            sample_size=args.sample_size,
+            plan_only=args.plan_only,
+            video_threads=args.video_threads,
         )
         sys.exit(walker.run())
     except Exception as exc:
@@ -0,0 +1,48 @@
+import pathlib
+import threading
+import zipfile
+
+from nautiluszim.constants import get_logger
+
+logger = get_logger()
+
+
+class ArchiveHandles:
+    """One ZipFile handle per thread on the collection's archive
+
+    A single ZipFile can be read from several threads but all reads go through
+    its shared file object, one at a time. With its own handle, each worker
+    seeks, inflates and checks CRCs of members in parallel (zlib releases the
+    GIL), spreading decompression of deflated members over cores.
+
+    Handles are opened on first use in each thread (each parsing the central
+    directory) and all closed together."""
+
+    def __init__(self, fpath: pathlib.Path):
+        self.fpath = fpath
+        self.local = threading.local()
+        self.handles: list[zipfile.ZipFile] = []
+        self.lock = threading.Lock()
+
+    def get(self) -> zipfile.ZipFile:
+        """calling thread's handle"""
+        handle = getattr(self.local, "handle", None)
+        if handle is None:
+            handle = self.local.handle = zipfile.ZipFile(self.fpath, "r")
+            with self.lock:
+                self.handles.append(handle)
+            logger.debug(f"Opened archive handle #{len(self.handles)}")
+        return handle
+
+    def close(self):
+        with self.lock:
+            for handle in self.handles:
+                handle.close()
+            self.handles.clear()
+        self.local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
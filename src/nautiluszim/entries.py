@@ -0,0 +1,41 @@
+import pathlib
+import unicodedata
+from dataclasses import dataclass
+
+
+def normalized_path(path: str) -> str:
+    """ASCII version of a path for use in URL"""
+    return unicodedata.normalize("NFKC", path)
+
+
+@dataclass
+class FileEntry:
+    """A single file from a collection entry, as it will be added to the ZIM"""
+
+    index: int  # position of the parent entry in the collection
+    uri: str  # URL or archive member
+    filename: str  # filename inside ZIM
+    size: int | None = None  # expected size in bytes, if known beforehand
+
+    @property
+    def path(self) -> str:
+        """path of the item in the ZIM"""
+        return "files/" + normalized_path(self.filename)
+
+    @property
+    def is_remote(self) -> bool:
+        return self.uri.startswith("http")
+
+
+@dataclass
+class StagedFile:
+    """Content of a file entry, fetched and ready to be added to the ZIM"""
+
+    category: str  # how it was obtained (download, archive, previous_zim…)
+    size: int
+    content: bytes | None = None  # either in memory
+    fpath: pathlib.Path | None = None  # or on disk
+    mimetype: str | None = None  # guessed by the Creator if None
+    delete_fpath: bool = True
+    started_on: float = 0.0  # perf_counter when processing started
+    source_size: int | None = None  # size before being recompressed
@@ -73,6 +73,14 @@ def main():
         action="store_true",
         dest="keep_build_dir",
     )
+    parser.add_argument(
+        "--resume",
+        help="Record progress in build folder and reuse files downloaded "
+        + "by a previous, interrupted run. Implies --keep",
+        default=False,
+        action="store_true",
+        dest="resume",
+    )
 
     parser.add_argument(
         "--language",
@@ -151,6 +159,146 @@ def main():
         dest="download_delay",
     )
 
+    parser.add_argument(
+        "--http-timeout",
+        help="Seconds without data after which a network request is retried. "
+        + "Defaults to 60",
+        type=int,
+        default=60,
+        dest="http_timeout",
+    )
+
+    parser.add_argument(
+        "--http-retries",
+        help="Number of retries (with exponential backoff) of network requests "
+        + "failing transiently. Downloads resume where they stopped when "
+        + "supported by the server. Defaults to 5",
+        type=int,
+        default=5,
+        dest="http_retries",
+    )
+
+    parser.add_argument(
+        "--workers",
+        help="Number of files fetched (downloaded, extracted) concurrently while "
+        + "others are written to the ZIM. Each worker reads the archive through "
+        + "its own handle, spreading decompression over cores. "
+        + "--download-delay applies to all workers together. Defaults to 1",
+        type=int,
+        default=1,
+        dest="workers",
+    )
+
+    parser.add_argument(
+        "--recompress",
+        help="Recompress images, videos and MP3 as they are added, keeping their "
+        + "format, using zimscraperlib presets of that quality. Kept as is if not "
+        + "smaller. Requires ffmpeg and gifsicle for videos, audio and GIFs",
+        choices=["low", "medium", "high"],
+        required=False,
+        dest="recompress",
+    )
+
+    parser.add_argument(
+        "--recompress-workers",
+        help="Number of files recompressed concurrently, apart from --workers "
+        + "fetching the next ones. Defaults to nb of CPUs",
+        type=int,
+        required=False,
+        dest="recompress_workers",
+    )
+
+    parser.add_argument(
+        "--sort-files",
+        help="Add files to the ZIM grouped by type and size for better compression "
+        + "and faster reading. Doesn't change the order of items in list",
+        action="store_true",
+        default=False,
+        dest="sort_files",
+    )
+
+    parser.add_argument(
+        "--staging-budget",
+        help="Maximum space (in MiB) used by fetched files until written to "
+        + "the ZIM. Downloads and extraction pause when reached. May be exceeded "
+        + "by what libzim needs to close its clusters (2MiB each, or a larger "
+        + "file). Unbounded otherwise",
+        type=int,
+        required=False,
+        dest="staging_budget",
+    )
+
+    parser.add_argument(
+        "--in-memory-threshold",
+        help="Files up to this size (in KiB) are added to the ZIM from memory, "
+        + "without a temporary file. Capped by --staging-budget. "
+        + "Defaults to 128. Use 0 to disable",
+        type=int,
+        default=128,
+        dest="in_memory_threshold",
+    )
+
+    parser.add_argument(
+        "--previous-zim",
+        help="Path to a previous ZIM of this collection, built with "
+        + "--files-manifest. Unchanged files (same source and size/CRC or ETag) "
+        + "are copied from it instead of being downloaded or extracted",
+        required=False,
+        dest="previous_zim",
+    )
+
+    parser.add_argument(
+        "--files-manifest",
+        help="Record fingerprints of files in ZIM metadata (X-Nautilus-Files, "
+        + "some 75 bytes per file) so a later build can reuse them with "
+        + "--previous-zim",
+        action="store_true",
+        default=False,
+        dest="files_manifest",
+    )
+
+    parser.add_argument(
+        "--build-report",
+        help="Write a JSON report of timings, throughput and memory per build "
+        + "phase and item category next to the ZIM (<zim>.report.json)",
+        action="store_true",
+        default=False,
+        dest="build_report",
+    )
+
+    parser.add_argument(
+        "--stats-filename",
+        help="Path to a JSON file updated with build progress: done/total files "
+        + "and (known) bytes, current phase, throughput and ETA",
+        required=False,
+        dest="stats_filename",
+    )
+
+    parser.add_argument(
+        "--profile",
+        help="Profile (cProfile) each build phase, including its worker threads. "
+        + "Stats are written to `profiles` in output folder",
+        action="store_true",
+        default=False,
+        dest="profile",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        help="Take tracemalloc snapshots at each build phase boundary. "
+        + "Written to `profiles` in output folder",
+        action="store_true",
+        default=False,
+        dest="profile_memory",
+    )
+
+    parser.add_argument(
+        "--prometheus-textfile",
+        help="Path to a .prom file (for node-exporter's textfile collector) "
+        + "periodically updated with build metrics",
+        required=False,
+        dest="prometheus_textfile",
+    )
+
     parser.add_argument(
         "--version",
         help="Display scraper version and exit",
@@ -0,0 +1,233 @@
+import dataclasses
+import io
+import random
+import re
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, BinaryIO
+
+from zimscraperlib.download import requests
+
+from nautiluszim.constants import get_logger
+
+logger = get_logger()
+
+CHUNK_SIZE = 2**16
+# statuses worth retrying: request timeout, too early, rate-limiting, server errors
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+
+class IncompleteTransferError(OSError):
+    """transfer ended (or stalled) before receiving the whole content"""
+
+
+def get_range_total(headers: Any) -> int | None:
+    """total size announced in a Content-Range header (`bytes a-b/total`)"""
+    match = re.match(r"bytes [\d\-*]+/(\d+)", headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+
+def get_validator(etag: str | None, last_modified: str | None) -> str | None:
+    """If-Range validator of a content: its strong ETag or else Last-Modified"""
+    if etag and not etag.startswith("W/"):
+        return etag
+    return last_modified or None
+
+
+@dataclasses.dataclass
+class TransferState:
+    """file being downloaded to, kept across attempts"""
+
+    fh: BinaryIO
+    # validator of fh's content, from the response which started it
+    validator: str | None = None
+
+
+class Fetcher:
+    """HTTP(S) requests and downloads with timeouts, retries and resume
+
+    Transient failures (connection errors, timeouts, stalls, 408/429/5xx…) are
+    retried with exponential backoff and jitter, honoring Retry-After.
+    Transfers resume where they stopped using a Range request (when supported
+    by the server) instead of starting over. A file from an earlier run is only
+    continued given the validator of its content (If-Range): the server sends
+    it whole should it have changed since.
+
+    A transfer is considered stalled, and retried, should it receive less than
+    stall_min_rate bytes/s over stall_timeout seconds.
+
+    Each thread uses its own requests Session (connection pool), Sessions not
+    being thread-safe."""
+
+    def __init__(
+        self,
+        *,
+        connect_timeout: float = 10,
+        read_timeout: float = 60,
+        retries: int = 5,
+        backoff: float = 1,
+        max_backoff: float = 120,
+        stall_timeout: float = 60,
+        stall_min_rate: int = 1024,
+        on_retry: Callable[[], Any] | None = None,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stall_timeout = stall_timeout
+        self.stall_min_rate = stall_min_rate
+        self.on_retry = on_retry
+        self.local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """calling thread's Session"""
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            # we rely on byte offsets to resume: no transparent decompression
+            session.headers["Accept-Encoding"] = "identity"
+        return session
+
+    def is_retryable(self, exc: Exception) -> bool:
+        if isinstance(exc, requests.HTTPError):
+            return (
+                exc.response is not None
+                and exc.response.status_code in RETRYABLE_STATUSES
+            )
+        return isinstance(
+            exc,
+            requests.ConnectionError
+            | requests.Timeout
+            | requests.exceptions.ChunkedEncodingError
+            | IncompleteTransferError,
+        )
+
+    def get_delay(self, attempt: int, exc: Exception) -> float:
+        """seconds to wait before retry number `attempt` (from 0)"""
+        if isinstance(exc, requests.HTTPError) and exc.response is not None:
+            retry_after = exc.response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        delay = min(self.backoff * 2**attempt, self.max_backoff)
+        # equal jitter: spreads retries of concurrent failures over time
+        return delay / 2 + random.uniform(0, delay / 2)  # noqa: S311
+
+    def with_retries(self, url: str, func: Callable[[], Any]) -> Any:
+        """func's result, calling it again on transient failures"""
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as exc:
+                if attempt >= self.retries or not self.is_retryable(exc):
+                    raise
+                delay = self.get_delay(attempt, exc)
+                attempt += 1
+                logger.warning(
+                    f"Error fetching {url}: {exc}. "
+                    f"Retrying in {delay:.1f}s ({attempt}/{self.retries})"
+                )
+                if self.on_retry:
+                    self.on_retry()
+                time.sleep(delay)
+
+    def check(self, url: str) -> Any:
+        """response headers of url, raising if it doesn't respond successfully"""
+
+        def request():
+            with self.session.get(url, stream=True, timeout=self.timeout) as resp:
+                resp.raise_for_status()
+                return resp.headers
+
+        return self.with_retries(url, request)
+
+    def fetch_content(self, url: str) -> bytes:
+        """content of url, in memory"""
+        buffer = io.BytesIO()
+        self.download_to(url, buffer)
+        return buffer.getvalue()
+
+    def download(
+        self,
+        url: str,
+        fpath: Any,
+        *,
+        validator: str | None = None,
+        expected_size: int | None = None,
+    ) -> str | None:
+        """download url to fpath, returning the validator of its content
+
+        fpath's existing content is continued only if its validator is passed,
+        overwritten otherwise. Raises should size differ from expected_size"""
+        with open(fpath, "ab" if validator else "wb") as fh:
+            validator = self.download_to(url, fh, validator=validator)
+            if expected_size is not None and fh.tell() != expected_size:
+                size = fh.tell()
+                # not to be continued
+                fh.truncate(0)
+                raise ValueError(
+                    f"Unexpected size for {url}: {size} != {expected_size}"
+                )
+        return validator
+
+    def download_to(
+        self, url: str, fh: BinaryIO, *, validator: str | None = None
+    ) -> str | None:
+        """write url's content to fh, from (and resuming at) its end
+
+        validator is that of fh's existing content. Returns the one of the
+        downloaded content"""
+        state = TransferState(fh, validator)
+        self.with_retries(url, lambda: self.transfer(url, state))
+        return state.validator
+
+    def transfer(self, url: str, state: TransferState):
+        """single attempt at writing url's content to state's fh, from its end"""
+        fh = state.fh
+        offset = fh.seek(0, io.SEEK_END)
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            # whole (200) if changed since then
+            if state.validator:
+                headers["If-Range"] = state.validator
+        with self.session.get(
+            url, stream=True, timeout=self.timeout, headers=headers
+        ) as resp:
+            if offset and resp.status_code == requests.codes.range_not_satisfiable:
+                if get_range_total(resp.headers) == offset:
+                    return  # already complete
+                fh.seek(0)
+                fh.truncate()
+                raise IncompleteTransferError(f"Can't resume at {offset}")
+            resp.raise_for_status()
+
+            if offset and resp.status_code == requests.codes.partial_content:
+                expected = get_range_total(resp.headers)
+                logger.debug(f"Resuming {url} at {offset}")
+            else:
+                if offset:
+                    logger.debug(f"{url} can't be resumed (or changed), restarting")
+                    fh.seek(0)
+                    fh.truncate()
+                state.validator = get_validator(
+                    resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                )
+                content_length = resp.headers.get("Content-Length", "")
+                expected = int(content_length) if content_length.isdigit() else None
+
+            window_start, window_bytes = time.monotonic(), 0
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                fh.write(chunk)
+                window_bytes += len(chunk)
+                now = time.monotonic()
+                if now - window_start >= self.stall_timeout:
+                    if window_bytes / (now - window_start) < self.stall_min_rate:
+                        raise IncompleteTransferError(f"Stalled at {fh.tell()}")
+                    window_start, window_bytes = now, 0
+
+        if expected is not None and fh.tell() != expected:
+            raise IncompleteTransferError(f"Got {fh.tell()} of {expected} bytes")
@@ -0,0 +1,77 @@
+import json
+import pathlib
+from typing import Any, BinaryIO
+
+from libzim.reader import Item  # pyright: ignore
+from zimscraperlib.zim.archive import Archive
+
+from nautiluszim.constants import get_logger
+
+logger = get_logger()
+
+# ZIM metadata holding fingerprints of all collection files, by path in ZIM
+MANIFEST_METADATA = "X-Nautilus-Files"
+# fingerprint keys identifying a content version. size alone is not enough
+STRONG_KEYS = ("crc32", "etag", "last-modified")
+# preset the file was recompressed with (--recompress), its size then differing
+RECOMPRESS_KEY = "recompress"
+# items are copied from the previous ZIM by chunks of that size
+COPY_CHUNK_SIZE = 2**20
+
+
+def fingerprint_from_headers(headers) -> dict[str, Any]:
+    """fingerprint of a remote file from its HTTP response headers"""
+    fingerprint = {}
+    if headers.get("Content-Length", "").isdigit():
+        fingerprint["size"] = int(headers["Content-Length"])
+    for key in ("ETag", "Last-Modified"):
+        if headers.get(key):
+            fingerprint[key.lower()] = headers[key]
+    return fingerprint
+
+
+def write_item_content(item: Item, fh: BinaryIO):
+    """write content of an item to fh by chunks, without copying it whole
+
+    item.content is a view on libzim's buffer: slicing it doesn't copy"""
+    content = item.content
+    for start in range(0, len(content), COPY_CHUNK_SIZE):
+        fh.write(content[start : start + COPY_CHUNK_SIZE])
+
+
+class PreviousZim:
+    """ZIM from a previous build of the collection, to reuse unchanged files from
+
+    Files are matched by path in ZIM, source URI and fingerprint (size plus
+    archive member's CRC32 or remote file's ETag/Last-Modified) as recorded in
+    the manifest metadata of that previous ZIM."""
+
+    def __init__(self, fpath: pathlib.Path):
+        self.fpath = fpath
+        self.archive = Archive(fpath)
+        try:
+            self.manifest = json.loads(
+                self.archive.get_metadata(MANIFEST_METADATA).decode("UTF-8")
+            )
+        except RuntimeError:
+            logger.warning(f"{fpath} has no {MANIFEST_METADATA}. Can't reuse files")
+            self.manifest = {}
+        logger.info(f"Previous ZIM has {len(self.manifest)} reusable files")
+
+    def get_item(self, path: str, uri: str, fingerprint: dict[str, Any]) -> Item | None:
+        """Item of the previous ZIM if it holds that exact same file"""
+        # an empty file's CRC32 is 0
+        if all(fingerprint.get(key) is None for key in STRONG_KEYS):
+            return None
+        if self.manifest.get(path) != {"uri": uri, **fingerprint}:
+            return None
+        try:
+            item = self.archive.get_item(path)
+        except KeyError:
+            return None
+        if RECOMPRESS_KEY not in fingerprint and fingerprint.get("size") not in (
+            None,
+            item.size,
+        ):
+            return None
+        return item
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import pathlib
+import threading
+from typing import Any
+
+from nautiluszim.constants import get_logger
+
+logger = get_logger()
+
+PLANNED = "planned"
+DOWNLOADED = "downloaded"
+ADDED = "added"
+
+
+def file_digest(fpath: pathlib.Path) -> str:
+    """hex SHA-256 digest of a file's content"""
+    with open(fpath, "rb") as fh:
+        return hashlib.file_digest(fh, "sha256").hexdigest()
+
+
+class Journal:
+    """Append-only record of each collection file's progress through the build
+
+    Each line is a JSON object with the `uri` of the file, its `state` and related
+    data (`validator` of the content being downloaded, then `fpath`, `size` and
+    `sha256` once downloaded). Later lines for a
+    given uri update earlier ones, so a build can be resumed from the last line
+    that made it to disk. A truncated last line (crash mid-write) is ignored."""
+
+    def __init__(self, fpath: pathlib.Path):
+        self.fpath = fpath
+        self.records: dict[str, dict[str, Any]] = {}
+        self.fh = None
+        # files are fetched and added from different threads
+        self.lock = threading.Lock()
+
+    def open(self):
+        """load previous records and start appending to journal"""
+        self.load()
+        truncated = False
+        if self.fpath.exists() and self.fpath.stat().st_size:
+            with open(self.fpath, "rb") as fh:
+                fh.seek(-1, 2)
+                truncated = fh.read(1) != b"\n"
+        self.fh = open(self.fpath, "a")
+        # don't append to an incomplete record
+        if truncated:
+            self.fh.write("\n")
+
+    def close(self):
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+
+    def load(self):
+        """read records of a previous run, if any"""
+        self.records.clear()
+        if not self.fpath.exists():
+            return
+        with open(self.fpath) as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring corrupt line in {self.fpath}")
+                    continue
+                self.records.setdefault(record["uri"], {}).update(record)
+        logger.info(f"Journal loaded with {len(self.records)} files")
+
+    def get(self, uri: str) -> dict[str, Any]:
+        return self.records.get(uri, {})
+
+    def record(self, uri: str, state: str, **data: Any):
+        """store new state (and data) for uri"""
+        record = {"uri": uri, "state": state, **data}
+        with self.lock:
+            self.records.setdefault(uri, {}).update(record)
+            if self.fh:
+                self.fh.write(json.dumps(record) + "\n")
+                self.fh.flush()
+
+    def get_downloaded(self, uri: str) -> pathlib.Path | None:
+        """path of a previously downloaded file, if still present and intact"""
+        record = self.get(uri)
+        if record.get("state") not in (DOWNLOADED, ADDED) or not record.get("fpath"):
+            return None
+        fpath = pathlib.Path(record["fpath"])
+        try:
+            if fpath.stat().st_size != record.get("size"):
+                return None
+        except FileNotFoundError:
+            return None
+        if file_digest(fpath) != record.get("sha256"):
+            logger.warning(f"Checksum mismatch for {fpath}, downloading again")
+            return None
+        return fpath
+
+    def record_download(self, uri: str, fpath: pathlib.Path):
+        """mark uri as downloaded to fpath"""
+        self.record(
+            uri,
+            DOWNLOADED,
+            fpath=str(fpath),
+            size=fpath.stat().st_size,
+            sha256=file_digest(fpath),
+        )
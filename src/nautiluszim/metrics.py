@@ -0,0 +1,113 @@
+import json
+import pathlib
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any
+
+from nautiluszim.constants import get_logger
+
+logger = get_logger()
+
+COUNTERS = ("items", "bytes_in", "bytes_out")
+
+
+def get_max_rss() -> int:
+    """process' peak resident set size so far, in bytes"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in KiB on Linux but in bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 2**10
+
+
+class BuildMetrics:
+    """Timing and throughput figures of a build, per phase and per item category
+
+    Phases are sequential steps of the build, each one ending the previous.
+    Items are counted per category (how they were obtained: download, archive…)
+    with bytes_in being what was read from the source and bytes_out what was
+    given to libzim. Counts also go to the current phase."""
+
+    def __init__(self):
+        self.started_on = time.time()
+        self.phases: dict[str, dict[str, Any]] = {}
+        self.categories: dict[str, Counter] = {}
+        self.current_phase: str | None = None
+        self.phase_counters = Counter()
+        self.phase_wall_start = self.phase_cpu_start = 0.0
+        self.retries = 0
+        self.retries_lock = threading.Lock()
+
+    def start_phase(self, name: str):
+        """end current phase (if any) and start recording a new one"""
+        self.end_phase()
+        logger.debug(f"Starting phase {name}")
+        self.current_phase, self.phase_counters = name, Counter()
+        self.phase_wall_start = time.perf_counter()
+        self.phase_cpu_start = time.process_time()
+
+    def current_phase_figures(self) -> dict[str, Any]:
+        """wall/CPU time, counters and peak RSS of current phase so far"""
+        if not self.current_phase:
+            return {}
+        return {
+            "wall_time": round(time.perf_counter() - self.phase_wall_start, 3),
+            "cpu_time": round(time.process_time() - self.phase_cpu_start, 3),
+            **{key: self.phase_counters[key] for key in COUNTERS},
+            "max_rss": get_max_rss(),
+        }
+
+    def end_phase(self):
+        """record figures of current phase"""
+        if not self.current_phase:
+            return
+        self.phases[self.current_phase] = self.current_phase_figures()
+        self.current_phase = None
+
+    def count(
+        self,
+        category: str,
+        *,
+        items: int = 1,
+        bytes_in: int = 0,
+        bytes_out: int = 0,
+        duration: float = 0,
+    ):
+        """account for item(s) of a category"""
+        counters = Counter(items=items, bytes_in=bytes_in, bytes_out=bytes_out)
+        self.categories.setdefault(category, Counter()).update(
+            {**counters, "duration": duration}
+        )
+        self.phase_counters.update(counters)
+
+    def count_retry(self):
+        """account for a retried network request (from any thread)"""
+        with self.retries_lock:
+            self.retries += 1
+
+    def total(self, key: str) -> int:
+        """sum of a counter over all categories"""
+        return sum(counter[key] for counter in self.categories.values())
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "started_on": self.started_on,
+            "wall_time": round(time.time() - self.started_on, 3),
+            "max_rss": get_max_rss(),
+            "retries": self.retries,
+            "phases": self.phases,
+            "categories": {
+                name: {
+                    **{key: counter[key] for key in COUNTERS},
+                    "duration": round(counter["duration"], 3),
+                }
+                for name, counter in self.categories.items()
+            },
+        }
+
+    def write_report(self, fpath: pathlib.Path, **extras: Any):
+        """dump metrics (and extra values) as JSON to fpath"""
+        with open(fpath, "w") as fh:
+            json.dump({**extras, **self.to_dict()}, fh, indent=2)
+        logger.info(f"Build report written to {fpath}")
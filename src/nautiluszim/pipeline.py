@@ -0,0 +1,145 @@
+import asyncio
+import concurrent.futures
+from collections.abc import Callable, Iterable
+
+from nautiluszim.constants import get_logger
+from nautiluszim.entries import FileEntry, StagedFile
+
+logger = get_logger()
+
+Transform = Callable[[FileEntry, StagedFile], StagedFile]
+
+
+class FilesPipeline:
+    """Concurrent fetch → verify → transform → add pipeline for file entries
+
+    - entries are reserved (staging budget) one at a time, in order
+    - then fetched, verified and transformed by `workers` threads
+    - then added to the ZIM in order, from a single thread as libzim's
+      Creator is not meant to be fed concurrently
+
+    Network waits and archive reads thus overlap with each other and with
+    libzim. With `transform_workers`, transforms run in their own threads so
+    that CPU-bound ones (recompression) don't hold back fetching: workers move
+    on to next entry once theirs is fetched. At most `queue_size` entries are in
+    flight (reserved but not added yet), keeping memory bounded along with the
+    staging budget.
+
+    First error stops the pipeline, cancelling pending entries, and is raised.
+    `cancel` is then called first so that a `reserve` blocked on the staging
+    budget returns (raising) rather than holding the executor's shutdown."""
+
+    def __init__(
+        self,
+        *,
+        reserve: Callable[[FileEntry], None],
+        stage: Callable[[FileEntry], StagedFile],
+        add: Callable[[FileEntry, StagedFile], None],
+        verify: Callable[[FileEntry, StagedFile], None] | None = None,
+        cancel: Callable[[], None] | None = None,
+        transforms: Iterable[Transform] = (),
+        workers: int = 1,
+        transform_workers: int = 0,
+        queue_size: int | None = None,
+    ):
+        self.reserve = reserve
+        self.stage = stage
+        self.add = add
+        self.verify = verify
+        self.cancel = cancel
+        self.transforms = list(transforms)
+        self.workers = max(workers, 1)
+        self.transform_workers = max(transform_workers, 0)
+        self.queue_size = queue_size or (self.workers + self.transform_workers) * 2
+
+    def process(self, entry: FileEntry) -> StagedFile:
+        """staged, verified and transformed entry (from a worker thread)
+
+        Transforms are left to transform() if they have their own workers"""
+        staged = self.stage(entry)
+        if self.verify:
+            self.verify(entry, staged)
+        if not self.transform_workers:
+            staged = self.transform(entry, staged)
+        return staged
+
+    def transform(self, entry: FileEntry, staged: StagedFile) -> StagedFile:
+        for transform in self.transforms:
+            staged = transform(entry, staged)
+        return staged
+
+    async def process_entry(
+        self,
+        entry: FileEntry,
+        workers_pool: concurrent.futures.Executor,
+        transforms_pool: concurrent.futures.Executor,
+    ) -> StagedFile:
+        loop = asyncio.get_running_loop()
+        staged = await loop.run_in_executor(workers_pool, self.process, entry)
+        if self.transform_workers:
+            staged = await loop.run_in_executor(
+                transforms_pool, self.transform, entry, staged
+            )
+        return staged
+
+    async def feed(
+        self,
+        entries: Iterable[FileEntry],
+        queue: asyncio.Queue,
+        workers_pool: concurrent.futures.Executor,
+        transforms_pool: concurrent.futures.Executor,
+    ):
+        loop = asyncio.get_running_loop()
+        for entry in entries:
+            # reserving may block until staged files are written: keep it off the loop
+            await loop.run_in_executor(None, self.reserve, entry)
+            future = asyncio.ensure_future(
+                self.process_entry(entry, workers_pool, transforms_pool)
+            )
+            await queue.put((entry, future))
+        await queue.put(None)
+
+    @staticmethod
+    async def get_next(queue: asyncio.Queue, feeder: asyncio.Task):
+        """next item from queue, or feeder's exception should it fail"""
+        getter = asyncio.ensure_future(queue.get())
+        await asyncio.wait((getter, feeder), return_when=asyncio.FIRST_COMPLETED)
+        if not getter.done() and (exc := feeder.exception()):
+            getter.cancel()
+            raise exc
+        return await getter
+
+    async def run(self, entries: Iterable[FileEntry]):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with (
+            concurrent.futures.ThreadPoolExecutor(
+                self.workers, thread_name_prefix="files"
+            ) as workers_pool,
+            # threads are only started if used
+            concurrent.futures.ThreadPoolExecutor(
+                max(self.transform_workers, 1), thread_name_prefix="transforms"
+            ) as transforms_pool,
+            concurrent.futures.ThreadPoolExecutor(
+                1, thread_name_prefix="creator"
+            ) as creator_pool,
+        ):
+            feeder = asyncio.create_task(
+                self.feed(entries, queue, workers_pool, transforms_pool)
+            )
+            try:
+                while item := await self.get_next(queue, feeder):
+                    entry, future = item
+                    staged = await future
+                    await loop.run_in_executor(creator_pool, self.add, entry, staged)
+                await feeder
+            except BaseException:
+                if self.cancel:
+                    self.cancel()
+                feeder.cancel()
+                workers_pool.shutdown(cancel_futures=True)
+                transforms_pool.shutdown(cancel_futures=True)
+                while not queue.empty():
+                    if item := queue.get_nowait():
+                        item[1].cancel()
+                raise
@@ -0,0 +1,108 @@
+import cProfile
+import pathlib
+import pstats
+import sys
+import threading
+import tracemalloc
+
+from nautiluszim.constants import get_logger
+
+logger = get_logger()
+
+TRACEMALLOC_TOP = 50  # nb of lines in tracemalloc text reports
+# cProfile sees all threads from python 3.12 (sys.monitoring)
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class PhaseProfiler:
+    """cProfile and/or tracemalloc snapshots for each phase of a build
+
+    For each phase, writes into output_dir:
+    - `<nn>_<phase>.prof`: cProfile stats (`python -m pstats`, snakeviz…)
+    - `<nn>_<phase>.tracemalloc`: tracemalloc snapshot at end of phase
+    - `<nn>_<phase>.tracemalloc.txt`: top allocations and growth over phase
+
+    Threads started during a phase (files fetching, recompression and adding
+    to the ZIM) are profiled along the main thread: before python 3.12, each
+    with its own cProfile, merged into the phase's stats."""
+
+    def __init__(
+        self,
+        output_dir: pathlib.Path,
+        *,
+        cpu: bool = True,
+        memory: bool = False,
+    ):
+        self.output_dir = output_dir
+        self.cpu = cpu
+        self.memory = memory
+        self.index = 0
+        self.phase: str | None = None
+        self.profile: cProfile.Profile | None = None
+        self.thread_profiles: list[cProfile.Profile] = []
+        self.lock = threading.Lock()
+        self.snapshot: tracemalloc.Snapshot | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.cpu or self.memory
+
+    def start(self, phase: str):
+        """start profiling a phase"""
+        if not self.enabled:
+            return
+        self.stop()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.index += 1
+        self.phase = phase
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.snapshot = tracemalloc.take_snapshot()
+        if self.cpu:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+            if not PROFILES_ALL_THREADS:
+                threading.setprofile(self.profile_thread)
+
+    def profile_thread(self, *_):
+        """first profile event of a new thread: hand it over to its own cProfile"""
+        profile = cProfile.Profile()
+        with self.lock:
+            self.thread_profiles.append(profile)
+        # replaces this hook for the calling thread
+        profile.enable()
+
+    def stop(self):
+        """stop profiling current phase, writing its outputs"""
+        if not self.phase:
+            return
+        prefix = self.output_dir.joinpath(f"{self.index:02d}_{self.phase}")
+        if self.profile:
+            self.profile.disable()
+            threading.setprofile(None)
+            stats = pstats.Stats(self.profile)
+            with self.lock:
+                for profile in self.thread_profiles:
+                    profile.create_stats()
+                    # pstats refuses profiles of threads which called nothing
+                    if profile.stats:  # pyright: ignore
+                        stats.add(profile)
+                self.thread_profiles.clear()
+            stats.dump_stats(f"{prefix}.prof")
+            self.profile = None
+        if self.memory and self.snapshot:
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(f"{prefix}.tracemalloc")
+            with open(f"{prefix}.tracemalloc.txt", "w") as fh:
+                fh.write(f"# top {TRACEMALLOC_TOP} allocations at end of phase\n")
+                for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                    fh.write(f"{stat}\n")
+                fh.write(f"\n# top {TRACEMALLOC_TOP} growths over phase\n")
+                for stat in snapshot.compare_to(self.snapshot, "lineno")[
+                    :TRACEMALLOC_TOP
+                ]:
+                    fh.write(f"{stat}\n")
+            self.snapshot = None
+        logger.debug(f"Profile of {self.phase} written to {prefix}.*")
+        self.phase = None
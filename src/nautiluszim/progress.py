@@ -0,0 +1,96 @@
+import datetime
+import json
+import os
+import pathlib
+import time
+
+from nautiluszim.constants import get_logger
+
+logger = get_logger()
+
+
+class PeriodicFile:
+    """File rewritten atomically (temp file then rename) for others to read
+
+    Meant to be updated very frequently: is_due() only allows a write once
+    per interval unless forced."""
+
+    def __init__(self, fpath: pathlib.Path, interval: float):
+        self.fpath = fpath
+        self.interval = interval
+        self.last_written_on = 0.0
+
+    def is_due(self, *, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and now - self.last_written_on < self.interval:
+            return False
+        self.last_written_on = now
+        return True
+
+    def write(self, content: str):
+        tmp_path = self.fpath.with_name(f".{self.fpath.name}.tmp")
+        try:
+            with open(tmp_path, "w") as fh:
+                fh.write(content)
+            os.replace(tmp_path, self.fpath)
+        except OSError as exc:
+            # reporting must not fail the build
+            logger.warning(f"Unable to write to {self.fpath}: {exc}")
+
+
+class ProgressFile(PeriodicFile):
+    """JSON progress file for orchestrators (zimfarm's --stats-filename)
+
+    Holds done/total files and bytes, current phase, throughput and ETA.
+    Throughput is that of the current phase or, should it make no progress
+    (finishing the ZIM), of the last one which did."""
+
+    def __init__(self, fpath: pathlib.Path, interval: float = 5):
+        super().__init__(fpath, interval)
+        self.phase = None
+        self.phase_started_on = time.monotonic()
+        # done and done_bytes when current phase started
+        self.phase_done = self.phase_done_bytes = 0
+        self.items_rate = self.bytes_rate = 0.0
+
+    def update(
+        self,
+        *,
+        phase: str,
+        done: int,
+        total: int,
+        done_bytes: int = 0,
+        total_bytes: int = 0,
+        force: bool = False,
+    ):
+        now = time.monotonic()
+        if phase != self.phase:
+            self.phase, self.phase_started_on = phase, now
+            self.phase_done, self.phase_done_bytes = done, done_bytes
+            force = True
+        # on every call, so a phase shorter than interval still has its rate
+        elapsed = now - self.phase_started_on
+        if elapsed and done > self.phase_done:
+            self.items_rate = (done - self.phase_done) / elapsed
+            self.bytes_rate = (done_bytes - self.phase_done_bytes) / elapsed
+        if not self.is_due(force=force):
+            return
+
+        items_rate, bytes_rate = self.items_rate, self.bytes_rate
+        eta = round((total - done) / items_rate) if items_rate else None
+        updated_on = datetime.datetime.now().isoformat(timespec="seconds")
+        self.write(
+            json.dumps(
+                {
+                    "done": done,
+                    "total": total,
+                    "done_bytes": done_bytes,
+                    "total_bytes": total_bytes,
+                    "phase": phase,
+                    "items_per_second": round(items_rate, 3),
+                    "bytes_per_second": round(bytes_rate),
+                    "eta": eta,
+                    "updated_on": updated_on,
+                }
+            )
+        )
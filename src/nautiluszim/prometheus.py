@@ -0,0 +1,170 @@
+import pathlib
+from typing import Any
+
+from nautiluszim.metrics import BuildMetrics
+from nautiluszim.progress import PeriodicFile
+
+PREFIX = "nautilus"
+# item categories of files obtained without downloading nor extracting
+CACHE_CATEGORIES = ("previous_zim", "resumed")
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_metric(
+    name: str,
+    kind: str,
+    help_text: str,
+    samples: list[tuple[dict[str, Any], float | int | None]],
+) -> str:
+    """text exposition of a single metric (HELP, TYPE and samples)"""
+    lines = [
+        f"# HELP {PREFIX}_{name} {help_text}",
+        f"# TYPE {PREFIX}_{name} {kind}",
+    ]
+    for labels, value in samples:
+        if value is None:
+            continue
+        labels_str = ",".join(
+            f'{key}="{escape_label(lvalue)}"' for key, lvalue in labels.items()
+        )
+        lines.append(
+            f"{PREFIX}_{name}{{{labels_str}}} {value}"
+            if labels_str
+            else f"{PREFIX}_{name} {value}"
+        )
+    return "\n".join(lines)
+
+
+def format_metrics(
+    metrics: BuildMetrics,
+    *,
+    name: str,
+    files_total: int,
+    zim_size: int | None = None,
+    finished: bool = False,
+) -> str:
+    """build metrics in Prometheus text format"""
+    categories = metrics.categories
+    phases = dict(metrics.phases)
+    running = metrics.current_phase_figures()
+    if running:
+        phases[metrics.current_phase] = running
+
+    def sum_of(key: str, *names: str) -> int:
+        return sum(categories[cat][key] for cat in names if cat in categories)
+
+    blocks = [
+        format_metric(
+            "build_info",
+            "gauge",
+            "Build identification",
+            [({"name": name, "phase": metrics.current_phase or "done"}, 1)],
+        ),
+        format_metric(
+            "build_start_time_seconds",
+            "gauge",
+            "Start of build, as UNIX timestamp",
+            [({}, round(metrics.started_on, 3))],
+        ),
+        format_metric(
+            "build_finished",
+            "gauge",
+            "Whether the build completed",
+            [({}, int(finished))],
+        ),
+        format_metric(
+            "files_expected",
+            "gauge",
+            "Number of collection files to add",
+            [({}, files_total)],
+        ),
+        format_metric(
+            "items_processed_total",
+            "counter",
+            "Items added to ZIM, per category",
+            [
+                ({"category": cat}, counter["items"])
+                for cat, counter in categories.items()
+            ],
+        ),
+        format_metric(
+            "bytes_in_total",
+            "counter",
+            "Bytes read from source, per category",
+            [
+                ({"category": cat}, counter["bytes_in"])
+                for cat, counter in categories.items()
+            ],
+        ),
+        format_metric(
+            "downloaded_bytes_total",
+            "counter",
+            "Bytes downloaded (files and archive)",
+            [({}, sum_of("bytes_in", "download", "archive_download"))],
+        ),
+        format_metric(
+            "extracted_bytes_total",
+            "counter",
+            "Bytes extracted from archive",
+            [({}, sum_of("bytes_in", "archive"))],
+        ),
+        format_metric(
+            "written_bytes_total",
+            "counter",
+            "Bytes given to libzim",
+            [({}, metrics.total("bytes_out"))],
+        ),
+        format_metric(
+            "retries_total",
+            "counter",
+            "Network requests retried",
+            [({}, metrics.retries)],
+        ),
+        format_metric(
+            "cache_hits_total",
+            "counter",
+            "Files reused instead of being downloaded or extracted",
+            [({"source": cat}, sum_of("items", cat)) for cat in CACHE_CATEGORIES],
+        ),
+        format_metric(
+            "phase_duration_seconds",
+            "gauge",
+            "Wall time spent in build phase",
+            [
+                ({"phase": phase}, figures["wall_time"])
+                for phase, figures in phases.items()
+            ],
+        ),
+        format_metric(
+            "phase_cpu_seconds",
+            "gauge",
+            "CPU time (main process) spent in build phase",
+            [
+                ({"phase": phase}, figures["cpu_time"])
+                for phase, figures in phases.items()
+            ],
+        ),
+        format_metric(
+            "zim_size_bytes",
+            "gauge",
+            "Size of produced ZIM file",
+            [({}, zim_size)],
+        ),
+    ]
+    return "\n".join(blocks) + "\n"
+
+
+class PrometheusTextfile(PeriodicFile):
+    """Build metrics for node-exporter's textfile collector
+
+    Periodically rewritten during the build, then finalized with ZIM size."""
+
+    def __init__(self, fpath: pathlib.Path, interval: float = 15):
+        super().__init__(fpath, interval)
+
+    def update(self, metrics: BuildMetrics, *, force: bool = False, **kwargs: Any):
+        if self.is_due(force=force):
+            self.write(format_metrics(metrics, **kwargs))
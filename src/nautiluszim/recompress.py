@@ -0,0 +1,151 @@
+import pathlib
+import tempfile
+
+from zimscraperlib.image.optimization import optimize_image
+from zimscraperlib.image.presets import (
+    GifHigh,
+    GifLow,
+    GifMedium,
+    JpegHigh,
+    JpegLow,
+    JpegMedium,
+    PngHigh,
+    PngLow,
+    PngMedium,
+    WebpHigh,
+    WebpLow,
+    WebpMedium,
+)
+from zimscraperlib.video.encoding import reencode
+from zimscraperlib.video.presets import (
+    VideoMp4High,
+    VideoMp4Low,
+    VideoWebmHigh,
+    VideoWebmLow,
+    VoiceMp3Low,
+)
+
+from nautiluszim.constants import get_logger
+from nautiluszim.entries import FileEntry, StagedFile
+
+logger = get_logger()
+
+# zimscraperlib preset per file extension, for each --recompress level.
+# Formats are kept as files are referenced by name from the collection.
+PRESETS: dict[str, dict[str, type]] = {
+    "low": {
+        "jpg": JpegLow,
+        "jpeg": JpegLow,
+        "png": PngLow,
+        "gif": GifLow,
+        "webp": WebpLow,
+        "webm": VideoWebmLow,
+        "mp4": VideoMp4Low,
+        "mp3": VoiceMp3Low,
+    },
+    "medium": {
+        "jpg": JpegMedium,
+        "jpeg": JpegMedium,
+        "png": PngMedium,
+        "gif": GifMedium,
+        "webp": WebpMedium,
+        "webm": VideoWebmLow,
+        "mp4": VideoMp4Low,
+        "mp3": VoiceMp3Low,
+    },
+    "high": {
+        "jpg": JpegHigh,
+        "jpeg": JpegHigh,
+        "png": PngHigh,
+        "gif": GifHigh,
+        "webp": WebpHigh,
+        "webm": VideoWebmHigh,
+        "mp4": VideoMp4High,
+    },
+}
+
+
+def get_extension(filename: str) -> str:
+    return pathlib.PurePosixPath(filename).suffix[1:].lower()
+
+
+class Recompressor:
+    """Recompresses staged files with zimscraperlib presets, keeping their format
+
+    Images are optimized with Pillow (and gifsicle), videos and audio re-encoded
+    with ffmpeg. Recompressed content is only used if smaller; failures are
+    logged and leave the file untouched. Content in memory stays in memory."""
+
+    def __init__(self, level: str, work_dir: pathlib.Path):
+        self.level = level
+        self.presets = PRESETS[level]
+        self.work_dir = work_dir
+
+    def get_preset(self, filename: str) -> type | None:
+        return self.presets.get(get_extension(filename))
+
+    def get_preset_id(self, filename: str) -> str | None:
+        """identifies output of a preset, to reuse from a previous ZIM"""
+        preset = self.get_preset(filename)
+        if not preset:
+            return None
+        return f"{preset.__name__}/{getattr(preset, 'VERSION', 1)}"
+
+    def encode(self, preset: type, src: pathlib.Path, dst: pathlib.Path) -> bool:
+        if preset.__module__.startswith("zimscraperlib.video"):
+            return reencode(src, dst, preset().to_ffmpeg_args(), failsafe=True)
+        optimize_image(src, dst, delete_src=False, convert=False, **preset.options)
+        return True
+
+    def recompress(self, entry: FileEntry, staged: StagedFile) -> StagedFile:
+        """staged file with recompressed content (same one if not smaller)"""
+        preset = self.get_preset(entry.filename)
+        if not preset:
+            return staged
+        suffix = pathlib.PurePosixPath(entry.filename).suffix.lower()
+        src, dst = staged.fpath, None
+        try:
+            if src is None:
+                with tempfile.NamedTemporaryFile(
+                    dir=self.work_dir, suffix=suffix, delete=False
+                ) as fh:
+                    fh.write(staged.content or b"")
+                src = pathlib.Path(fh.name)
+            # unique name, keeping suffix as formats are guessed from it
+            with tempfile.NamedTemporaryFile(
+                dir=self.work_dir, suffix=suffix, delete=False
+            ) as fh:
+                dst = pathlib.Path(fh.name)
+
+            try:
+                succeeded = self.encode(preset, src, dst)
+            except Exception as exc:
+                logger.warning(f"Failed to recompress {entry.uri}: {exc}")
+                succeeded = False
+            size = dst.stat().st_size if succeeded and dst.exists() else 0
+            if not size or size >= staged.size:
+                return staged
+
+            logger.debug(
+                f"Recompressed {entry.path} with {preset.__name__}: "
+                f"{staged.size} -> {size}"
+            )
+            recompressed = StagedFile(
+                category=staged.category,
+                size=size,
+                mimetype=staged.mimetype,
+                started_on=staged.started_on,
+                source_size=staged.size,
+            )
+            if staged.content is not None:
+                recompressed.content = dst.read_bytes()
+            else:
+                recompressed.fpath, dst = dst, None
+                if staged.delete_fpath:
+                    staged.fpath.unlink(missing_ok=True)
+            return recompressed
+        finally:
+            if dst:
+                dst.unlink(missing_ok=True)
+            if src and src != staged.fpath:
+                src.unlink(missing_ok=True)
@@ -1,18 +1,22 @@
+import asyncio
+import contextlib
 import datetime
+import functools
+import hashlib
 import json
 import locale
 import os
 import pathlib
 import shutil
 import tempfile
+import threading
 import time
-import unicodedata
 import uuid
 import zipfile
 from pathlib import Path
+from typing import Any
 
 import jinja2
-from zimscraperlib.download import requests, save_large_file
 from zimscraperlib.i18n import _, get_language_details, setlocale
 from zimscraperlib.image.convertion import create_favicon
 from zimscraperlib.image.probing import get_colors, is_hex_color
@@ -20,16 +24,30 @@ from zimscraperlib.image.transformation import resize_image
 from zimscraperlib.inputs import compute_descriptions, handle_user_provided_file
 from zimscraperlib.zim.creator import Creator
 
+from nautiluszim.archive import ArchiveHandles
 from nautiluszim.constants import ROOT_DIR, SCRAPER, get_logger
+from nautiluszim.entries import FileEntry, StagedFile, normalized_path
+from nautiluszim.fetcher import Fetcher, get_validator
+from nautiluszim.incremental import (
+    MANIFEST_METADATA,
+    RECOMPRESS_KEY,
+    PreviousZim,
+    fingerprint_from_headers,
+    write_item_content,
+)
+from nautiluszim.journal import ADDED, PLANNED, Journal
+from nautiluszim.metrics import BuildMetrics
+from nautiluszim.ordering import sort_for_locality
+from nautiluszim.pipeline import FilesPipeline
+from nautiluszim.profiling import PhaseProfiler
+from nautiluszim.progress import ProgressFile
+from nautiluszim.prometheus import PrometheusTextfile
+from nautiluszim.recompress import Recompressor
+from nautiluszim.staging import StagingArea
 
 logger = get_logger()
 
 
-def normalized_path(path: str) -> str:
-    """ASCII version of a path for use in URL"""
-    return unicodedata.normalize("NFKC", path)
-
-
 class Nautilus:
     def __init__(
         self,
@@ -58,6 +76,23 @@ class Nautilus:
         secondary_color=None,
         about=None,
         download_delay=None,
+        *,
+        sort_files=False,
+        staging_budget=None,
+        in_memory_threshold=0,
+        resume=False,
+        previous_zim=None,
+        files_manifest=False,
+        build_report=False,
+        stats_filename=None,
+        profile=False,
+        profile_memory=False,
+        prometheus_textfile=None,
+        http_timeout=60,
+        http_retries=5,
+        workers=1,
+        recompress=None,
+        recompress_workers=None,
     ):
         # options & zim params
         self.archive = archive
@@ -82,17 +117,77 @@ class Nautilus:
         self.about = about
         self.randomize = not no_random
         self.download_delay = download_delay
+        # downloads of all workers are spaced by download_delay
+        self.download_lock = threading.Lock()
+        self.next_download_on = 0.0
+        self.sort_files = sort_files
+        # nb of files fetched concurrently
+        self.workers = workers
+        # level of recompression of media files as they're added (None to keep)
+        self.recompress = recompress
+        self.recompress_workers = recompress_workers or os.cpu_count() or 1
+        self.recompressor: Recompressor | None = None
+        # files waiting to be written to ZIM (budget in MiB)
+        self.staging = StagingArea(
+            budget=staging_budget * 2**20 if staging_budget else None
+        )
+        # files up to this size (KiB) are added from memory, without temp file
+        self.in_memory_threshold = (in_memory_threshold or 0) * 2**10
+        if self.staging.is_bounded:
+            self.in_memory_threshold = min(
+                self.in_memory_threshold, self.staging.budget
+            )
+
+        self.previous_zim_path = (
+            Path(previous_zim).expanduser().resolve() if previous_zim else None
+        )
+        self.previous_zim = None
+        # record files fingerprints in ZIM, for a later --previous-zim
+        self.files_manifest = files_manifest
+
+        self.build_report = build_report
+        self.metrics = BuildMetrics()
+        self.progress = (
+            ProgressFile(Path(stats_filename).expanduser().resolve())
+            if stats_filename
+            else None
+        )
+        self.prometheus = (
+            PrometheusTextfile(Path(prometheus_textfile).expanduser().resolve())
+            if prometheus_textfile
+            else None
+        )
+        self.files_total = self.files_total_bytes = self.files_done_bytes = 0
+        # shared by URL checks, archive and files downloads
+        self.fetcher = Fetcher(
+            read_timeout=http_timeout,
+            retries=http_retries,
+            on_retry=self.metrics.count_retry,
+        )
 
         # process-related
         self.output_dir = Path(output_dir).expanduser().resolve()
+        self.profiler = PhaseProfiler(
+            self.output_dir.joinpath("profiles"), cpu=profile, memory=profile_memory
+        )
         self.period = datetime.datetime.now().strftime("%Y-%m")
 
         # debug/devel options
         self.debug = debug
-        self.keep_build_dir = keep_build_dir
+        self.keep_build_dir = keep_build_dir or resume
 
         self.build_dir = self.output_dir.joinpath("build")
 
+        # progress journal, allowing to resume downloads of an interrupted build
+        self.journal = (
+            Journal(self.build_dir.joinpath("journal.jsonl")) if resume else None
+        )
+
+        # size and version identifiers of files (by URI), as discovered during checks
+        self.fingerprints: dict[str, dict[str, Any]] = {}
+        # fingerprints of files added to the ZIM (by path), recorded in metadata
+        self.manifest: dict[str, dict[str, Any]] = {}
+
         # set and record locale for translations
         locale_name = (
             locale_name
@@ -115,6 +210,11 @@ class Nautilus:
     def templates_dir(self):
         return self.root_dir.joinpath("templates")
 
+    @property
+    def downloads_dir(self):
+        """where remote files are kept for reuse when resuming"""
+        return self.build_dir.joinpath("downloads")
+
     @property
     def archive_path(self):
         return (
@@ -132,21 +232,32 @@ class Nautilus:
 
         logger.info(f"starting nautilus scraper for {self.archive}")
 
+        self.start_phase("preparation")
         logger.info(f"preparing build folder at {self.build_dir.resolve()}")
         if not self.keep_build_dir and self.build_dir.exists():
             shutil.rmtree(self.build_dir)
         self.make_build_folder()
+        self.check_staging_space()
+        if self.journal:
+            self.journal.open()
 
         # fail early if supplied branding files are missing
         self.check_branding_values()
 
+        if self.previous_zim_path:
+            logger.info(f"opening previous ZIM at {self.previous_zim_path}")
+            self.previous_zim = PreviousZim(self.previous_zim_path)
+
         # fail early if remote entries URLs are not OK
+        self.start_phase("url_checks")
         self.test_all_urls()
 
         # download archive
         if self.archive:
+            self.start_phase("archive_download")
             self.download_archive()
 
+        self.start_phase("collection_checks")
         if not self.collection:
             self.collection = self.extract_to_fs("collection.json")
             if not self.about:
@@ -157,6 +268,7 @@ class Nautilus:
         else:
             self.test_archive_collection()
 
+        self.start_phase("metadata")
         logger.info("update general metadata")
         self.update_metadata()
 
@@ -183,14 +295,48 @@ class Nautilus:
             )
         self.zim_creator.start()
 
+        self.start_phase("ui")
         logger.info("adding U.I")
         self.add_ui()
 
+        # totals are known before the phase's first progress update
+        entries = self.get_file_entries()
+        self.files_total = len(entries)
+        self.files_total_bytes = sum(entry.size or 0 for entry in entries)
+
+        self.start_phase("files")
         logger.info("Adding all files")
-        self.process_collection_entries()
+        self.process_collection_entries(entries)
+
+        if self.files_manifest:
+            self.zim_creator.add_metadata(
+                MANIFEST_METADATA,
+                json.dumps(self.manifest),
+                mimetype="application/json",
+            )
 
+        self.start_phase("finish")
         logger.info("Finishing ZIM file")
         self.zim_creator.finish()
+        self.end_phase()
+        self.update_progress(phase="done")
+        if self.prometheus:
+            zim_path = self.output_dir / self.fname
+            self.prometheus.update(
+                self.metrics,
+                force=True,
+                name=self.name,
+                files_total=self.files_total,
+                zim_size=zim_path.stat().st_size if zim_path.exists() else None,
+                finished=True,
+            )
+        logger.debug(f"Staging area peaked at {self.staging.peak} bytes")
+
+        if self.journal:
+            self.journal.close()
+
+        if self.build_report:
+            self.write_build_report()
 
         logger.info("removing HTML folder")
         if not self.keep_build_dir:
@@ -198,17 +344,74 @@ class Nautilus:
 
         logger.info("all done!")
 
+    def start_phase(self, name: str):
+        """mark the start of a new build phase (ending the current one)"""
+        self.end_phase()
+        self.metrics.start_phase(name)
+        self.profiler.start(name)
+        self.update_progress(phase=name)
+
+    def end_phase(self):
+        self.profiler.stop()
+        self.metrics.end_phase()
+
+    def update_progress(self, *, phase: str | None = None, force: bool = False):
+        """update progress file and metrics (if requested), at a bounded rate"""
+        if self.prometheus:
+            self.prometheus.update(
+                self.metrics,
+                force=force or phase is not None,
+                name=self.name,
+                files_total=self.files_total,
+            )
+        if not self.progress:
+            return
+        self.progress.update(
+            phase=phase or self.metrics.current_phase or "",
+            done=len(self.manifest),
+            total=self.files_total,
+            done_bytes=self.files_done_bytes,
+            total_bytes=self.files_total_bytes,
+            force=force,
+        )
+
+    def write_build_report(self):
+        """JSON report of build metrics, next to the ZIM"""
+        zim_path = self.output_dir / self.fname
+        self.metrics.write_report(
+            zim_path.with_suffix(".report.json"),
+            scraper=SCRAPER,
+            zim_file=str(zim_path),
+            zim_size=zim_path.stat().st_size if zim_path.exists() else None,
+            nb_items=len(self.json_collection),
+            nb_files=len(self.manifest),
+            staging_peak=self.staging.peak,
+        )
+
     def make_build_folder(self):
         """prepare build folder before we start downloading data"""
 
         # create build folder
         os.makedirs(self.build_dir, exist_ok=True)
+        if self.journal:
+            os.makedirs(self.downloads_dir, exist_ok=True)
         for fname in ("favicon.png", "main-logo.png"):
             shutil.copy2(
                 self.templates_dir.joinpath(fname),
                 self.build_dir.joinpath(fname),
             )
 
+    def check_staging_space(self):
+        """warn if staging budget can't be honored by build folder's disk"""
+        if not self.staging.is_bounded:
+            return
+        free_space = shutil.disk_usage(self.build_dir).free
+        if free_space < self.staging.budget:
+            logger.warning(
+                f"Staging budget ({self.staging.budget} bytes) is larger than "
+                f"free space in {self.build_dir} ({free_space} bytes)"
+            )
+
     def check_branding_values(self):
         """checks that user-supplied images and colors are valid (so to fail early)
 
@@ -302,15 +505,45 @@ class Nautilus:
     def download_archive(self):
         # download if it's a URL
         if self.archive.startswith("http"):
+            if self.journal and self.journal.get_downloaded(self.archive):
+                logger.info(f"Reusing archive downloaded at {self.archive_path}")
+                return
             logger.info(f"Downloading archive at {self.archive}")
-            save_large_file(self.archive, self.archive_path)
+            self.fingerprints[self.archive] = fingerprint_from_headers(
+                self.fetcher.check(self.archive)
+            )
+            self.download_url(self.archive, self.archive_path)
+            self.metrics.count(
+                "archive_download",
+                items=0,
+                bytes_in=self.archive_path.stat().st_size,
+            )
+            if self.journal:
+                self.journal.record_download(self.archive, self.archive_path)
+
+    @contextlib.contextmanager
+    def open_archive(self):
+        """archive's per-thread ZipFile handles (None if archiveless)"""
+        if not self.archive:
+            yield None
+            return
+        with ArchiveHandles(self.archive_path) as handles:
+            yield handles
 
     def extract_to_fs(
-        self, name: str, *, failsafe: bool | None = False
+        self,
+        name: str,
+        *,
+        failsafe: bool | None = False,
+        handle: zipfile.ZipFile | None = None,
     ) -> pathlib.Path | None:
         """extracting single archive member `name` to filesystem at `to`"""
 
-        with zipfile.ZipFile(self.archive_path, "r") as zh:
+        with (
+            contextlib.nullcontext(handle)
+            if handle
+            else zipfile.ZipFile(self.archive_path, "r")
+        ) as zh:
             try:
                 normalized_name = zh.extract(member=name, path=self.build_dir)
                 return self.build_dir.joinpath(normalized_name)
@@ -350,18 +583,13 @@ class Nautilus:
                     continue
 
                 try:
-                    resp = requests.get(url, stream=True)
+                    headers = self.fetcher.check(url)
                 except Exception as exc:
-                    logger.error(f"- Connection Error: {url} ({exc})")
+                    logger.error(f"- Unable to access {url} ({exc})")
                     failed = True
                     continue
 
-                try:
-                    resp.raise_for_status()
-                except Exception as exc:
-                    logger.error(f"- HTTP {resp.status_code}: {url} ({exc})")
-                    failed = True
-                    continue
+                self.fingerprints[url] = fingerprint_from_headers(headers)
 
         if failed:
             raise ValueError("Remote entries failed access test")
@@ -392,7 +620,13 @@ class Nautilus:
         """Test the collection.json with the archive file"""
         self.load_collection()
         with zipfile.ZipFile(self.archive_path, "r") as zh:
-            all_names = zh.namelist()
+            all_names = []
+            for info in zh.infolist():
+                all_names.append(info.filename)
+                self.fingerprints[info.filename] = {
+                    "size": info.file_size,
+                    "crc32": info.CRC,
+                }
         duplicate_filenames, missing_filenames, _ = self.test_files(all_names)
 
         self._ensure_no_missing_files(missing_filenames, all_names)
@@ -476,35 +710,271 @@ class Nautilus:
         filename = file.get("filename", filename)
         return (uri, filename)
 
-    def process_collection_entries(self):
+    def get_file_entries(self) -> list[FileEntry]:
+        """all file entries of the collection, in the order they should be added"""
+        entries = []
         for index, entry in enumerate(self.json_collection):
             if not entry.get("files"):
                 continue
-
             for file in entry["files"]:
                 uri, filename = self.get_file_entry_from(file)
-                logger.debug(f"> {uri}")
-
-                if uri.startswith("http"):
-                    if self.download_delay and index > 0:
-                        logger.debug(f"Sleeping {self.download_delay} seconds")
-                        time.sleep(self.download_delay)
-                    fpath = pathlib.Path(
-                        tempfile.NamedTemporaryFile(
-                            dir=self.build_dir, delete=False
-                        ).name
+                entries.append(
+                    FileEntry(
+                        index=index,
+                        uri=uri,
+                        filename=filename,
+                        size=self.fingerprints.get(uri, {}).get("size"),
                     )
-                    save_large_file(uri, fpath)
-                else:
-                    fpath = self.extract_to_fs(uri)
-
-                self.zim_creator.add_item_for(
-                    path="files/" + normalized_path(filename),
-                    fpath=fpath,
-                    delete_fpath=True,
-                    is_front=False,
                 )
 
+        if self.sort_files:
+            logger.debug("Sorting files by type and size")
+            entries = sort_for_locality(entries)
+        return entries
+
+    def process_collection_entries(self, entries: list[FileEntry]):
+        if self.journal:
+            for entry in entries:
+                if not self.journal.get(entry.uri):
+                    self.journal.record(entry.uri, PLANNED)
+
+        transforms = []
+        if self.recompress:
+            work_dir = self.build_dir.joinpath("recompress")
+            work_dir.mkdir(parents=True, exist_ok=True)
+            self.recompressor = Recompressor(self.recompress, work_dir)
+            transforms.append(self.recompress_staged_file)
+
+        with self.open_archive() as handles:
+            pipeline = FilesPipeline(
+                reserve=self.reserve_file_entry,
+                cancel=self.staging.close,
+                stage=functools.partial(self.stage_file_entry, handles=handles),
+                verify=self.verify_staged_file,
+                transforms=transforms,
+                add=self.add_staged_file,
+                workers=self.workers,
+                # encoding doesn't hold back fetching
+                transform_workers=self.recompress_workers if transforms else 0,
+            )
+            asyncio.run(pipeline.run(entries))
+
+    def get_zim_fingerprint(self, entry: FileEntry) -> dict[str, Any]:
+        """fingerprint of entry's item in ZIM: source's and recompression preset"""
+        fingerprint = self.fingerprints.get(entry.uri, {})
+        preset_id = (
+            self.recompressor.get_preset_id(entry.filename)
+            if self.recompressor
+            else None
+        )
+        if preset_id:
+            return {**fingerprint, RECOMPRESS_KEY: preset_id}
+        return fingerprint
+
+    def reserve_file_entry(self, entry: FileEntry):
+        """reserve staging space, waiting for libzim to write some if over budget"""
+        self.staging.reserve(entry.size or 0)
+
+    def stage_file_entry(
+        self, entry: FileEntry, handles: ArchiveHandles | None
+    ) -> StagedFile:
+        """fetch a single file, into memory if small enough"""
+        logger.debug(f"> {entry.uri}")
+        started_on = time.perf_counter()
+        # each worker thread reads the archive through its own handle
+        zh = handles.get() if handles and not entry.is_remote else None
+
+        fingerprint = self.get_zim_fingerprint(entry)
+        previous_item = (
+            self.previous_zim.get_item(entry.path, entry.uri, fingerprint)
+            if self.previous_zim
+            else None
+        )
+
+        content, fpath, mimetype, delete_fpath = None, None, None, True
+        source_size = None
+        category = "download" if entry.is_remote else "archive"
+        if previous_item:
+            logger.debug(f"Reusing {entry.path} from previous ZIM")
+            category = "previous_zim"
+            mimetype = previous_item.mimetype
+            if RECOMPRESS_KEY in fingerprint:
+                source_size = fingerprint.get("size")
+            if previous_item.size <= self.in_memory_threshold:
+                content = bytes(previous_item.content)
+            else:
+                with tempfile.NamedTemporaryFile(
+                    dir=self.build_dir, delete=False
+                ) as fh:
+                    write_item_content(previous_item, fh)
+                fpath = pathlib.Path(fh.name)
+        elif self.journal and entry.is_remote:
+            # kept on disk (not deleted once added) for resuming builds
+            delete_fpath = False
+            fpath = self.journal.get_downloaded(entry.uri)
+            if fpath:
+                logger.debug(f"Reusing {fpath}")
+                category = "resumed"
+            else:
+                fpath = self.fetch_to_downloads(entry)
+        elif entry.size is not None and entry.size <= self.in_memory_threshold:
+            content = self.fetch_content(entry, zh)
+        else:
+            fpath = self.fetch_file(entry, zh)
+        size = fpath.stat().st_size if fpath else len(content or b"")
+        self.staging.resize(entry.size or 0, size)
+
+        return StagedFile(
+            category=category,
+            size=size,
+            content=content,
+            fpath=fpath,
+            mimetype=mimetype,
+            delete_fpath=delete_fpath,
+            started_on=started_on,
+            source_size=source_size,
+        )
+
+    def verify_staged_file(self, entry: FileEntry, staged: StagedFile):
+        """ensure fetched content matches the size discovered during checks"""
+        expected = self.fingerprints.get(entry.uri, {}).get("size")
+        size = staged.size if staged.source_size is None else staged.source_size
+        if expected is not None and size != expected:
+            raise ValueError(f"Unexpected size for {entry.uri}: {size} != {expected}")
+
+    def recompress_staged_file(
+        self, entry: FileEntry, staged: StagedFile
+    ) -> StagedFile:
+        """recompressed staged file (unless reused from previous ZIM)"""
+        if not self.recompressor or staged.category == "previous_zim":
+            return staged
+        recompressed = self.recompressor.recompress(entry, staged)
+        self.staging.resize(staged.size, recompressed.size)
+        return recompressed
+
+    def add_staged_file(self, entry: FileEntry, staged: StagedFile):
+        """add a fetched file to the ZIM and account for it"""
+        # libzim holds on to it until its cluster is written
+        self.staging.hand_over(staged.size)
+        self.zim_creator.add_item_for(
+            path=entry.path,
+            fpath=staged.fpath,
+            content=staged.content,
+            mimetype=staged.mimetype,
+            delete_fpath=staged.delete_fpath,
+            is_front=False,
+            callback=(self.staging.release, staged.size),
+        )
+        self.manifest[entry.path] = {
+            "uri": entry.uri,
+            **self.get_zim_fingerprint(entry),
+        }
+        source_size = staged.size if staged.source_size is None else staged.source_size
+        self.metrics.count(
+            staged.category,
+            bytes_in=source_size,
+            bytes_out=staged.size,
+            duration=time.perf_counter() - staged.started_on,
+        )
+        self.files_done_bytes += source_size
+        self.update_progress()
+        if self.journal:
+            self.journal.record(entry.uri, ADDED)
+
+    def sleep_before_download(self):
+        """wait for download_delay since previous download (of any worker)"""
+        if not self.download_delay:
+            return
+        with self.download_lock:
+            now = time.monotonic()
+            delay = self.next_download_on - now
+            self.next_download_on = max(now, self.next_download_on)
+            self.next_download_on += self.download_delay
+        if delay > 0:
+            logger.debug(f"Sleeping {delay:.1f} seconds")
+            time.sleep(delay)
+
+    def fetch_content(self, entry: FileEntry, zh: zipfile.ZipFile | None) -> bytes:
+        """content of a (small) file entry, read into memory"""
+        if entry.is_remote:
+            self.sleep_before_download()
+            return self.fetcher.fetch_content(entry.uri)
+        if not zh:
+            raise ValueError(f"No archive to read {entry.uri} from")
+        return zh.read(entry.uri)
+
+    def fetch_file(self, entry: FileEntry, zh: zipfile.ZipFile | None) -> pathlib.Path:
+        """path to a file in build folder holding the file entry's content"""
+        if entry.is_remote:
+            self.sleep_before_download()
+            fpath = pathlib.Path(
+                tempfile.NamedTemporaryFile(dir=self.build_dir, delete=False).name
+            )
+            self.fetcher.download(entry.uri, fpath)
+            return fpath
+        fpath = self.extract_to_fs(entry.uri, handle=zh)
+        if not fpath:
+            raise ValueError(f"Unable to extract {entry.uri}")
+        return fpath
+
+    def fetch_to_downloads(self, entry: FileEntry) -> pathlib.Path:
+        """path to remote file entry downloaded to (and journaled in) downloads"""
+        if not self.journal:
+            raise ValueError("Downloads folder is only used when resuming")
+
+        self.sleep_before_download()
+        # stable name so a partial download is continued
+        fpath = self.downloads_dir.joinpath(
+            hashlib.sha256(entry.uri.encode("UTF-8")).hexdigest()
+        )
+        self.download_url(entry.uri, fpath)
+        self.journal.record_download(entry.uri, fpath)
+        return fpath
+
+    def download_url(self, url: str, fpath: pathlib.Path):
+        """download url to fpath, continuing a partial download of previous run
+
+        Only with --resume, for a download planned with a validator (ETag or
+        Last-Modified) in the journal: fpath is overwritten otherwise"""
+        fingerprint = self.fingerprints.get(url, {})
+        validator = None
+        if self.journal:
+            record = self.journal.get(url)
+            if record.get("state") == PLANNED and record.get("validator"):
+                validator = record["validator"]
+            else:
+                self.journal.record(
+                    url,
+                    PLANNED,
+                    validator=get_validator(
+                        fingerprint.get("etag"), fingerprint.get("last-modified")
+                    ),
+                )
+        self.fetcher.download(
+            url, fpath, validator=validator, expected_size=fingerprint.get("size")
+        )
+
+    def get_database_js(self) -> str:
+        """JS source of the items database, loaded by the reader UI"""
+        database_js = "var DATABASE = [\n"
+        for docid, document in enumerate(self.json_collection):
+            database_js += "{},\n".format(
+                str(
+                    {
+                        "_id": str(docid).zfill(5),
+                        "ti": document.get("title") or "Unknown?",
+                        "dsc": document.get("description") or "",
+                        "aut": document.get("authors") or "",
+                        "fp": [
+                            normalized_path(self.get_file_entry_from(file)[1])
+                            for file in document.get("files", [])
+                        ],
+                    }
+                )
+            )
+        database_js += "];\n"
+        return database_js
+
     def add_ui(self):
         """make up HTML structure to read the content"""
 
@@ -517,6 +987,7 @@ class Nautilus:
             fpath = self.build_dir.joinpath(fname)
             if fpath.exists():
                 self.zim_creator.add_item_for(path=fname, fpath=fpath)
+                self.metrics.count("ui", bytes_out=fpath.stat().st_size)
 
         env = jinja2.Environment(
             loader=jinja2.FileSystemLoader(str(self.templates_dir)), autoescape=True
@@ -549,6 +1020,7 @@ class Nautilus:
         self.zim_creator.add_item_for(
             path="home", content=html, mimetype="text/html", is_front=True
         )
+        self.metrics.count("ui", bytes_out=len(html))
 
         initjs = env.get_template("init.js").render(
             debug=str(self.debug).lower(),
@@ -568,30 +1040,16 @@ class Nautilus:
             mimetype="text/javascript",
             is_front=False,
         )
+        self.metrics.count("ui", bytes_out=len(initjs))
 
-        database_js = "var DATABASE = [\n"
-        for docid, document in enumerate(self.json_collection):
-            database_js += "{},\n".format(
-                str(
-                    {
-                        "_id": str(docid).zfill(5),
-                        "ti": document.get("title") or "Unknown?",
-                        "dsc": document.get("description") or "",
-                        "aut": document.get("authors") or "",
-                        "fp": [
-                            normalized_path(self.get_file_entry_from(file)[1])
-                            for file in document.get("files", [])
-                        ],
-                    }
-                )
-            )
-        database_js += "];\n"
+        database_js = self.get_database_js()
         self.zim_creator.add_item_for(
             path="database.js",
             content=database_js,
             mimetype="text/javascript",
             is_front=False,
         )
+        self.metrics.count("database", bytes_out=len(database_js))
 
         # recursively add all templates's folder
         for fpath in self.templates_dir.glob("**/*"):
@@ -604,3 +1062,4 @@ class Nautilus:
 
             logger.debug(f"> {path}")
             self.zim_creator.add_item_for(path=path, fpath=fpath, is_front=False)
+            self.metrics.count("ui", bytes_out=fpath.stat().st_size)
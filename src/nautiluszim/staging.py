@@ -0,0 +1,123 @@
+import heapq
+import threading
+import time
+from collections import Counter
+
+from nautiluszim.constants import get_logger
+
+logger = get_logger()
+
+# libzim's default: clusters are closed once they'd go over it
+CLUSTER_SIZE = 2**21
+
+
+class StagingClosedError(RuntimeError):
+    """reservation attempted or pending while the staging area is closed"""
+
+
+class StagingArea:
+    """Bounded byte budget for fetched data until libzim has written it
+
+    Files are downloaded or extracted to the build folder (or memory) then
+    handed over to libzim which writes them asynchronously, deleting them once
+    done. Producers reserve space before staging a file and block while the
+    budget is exhausted. Space is released from the Creator's callback, once
+    the item's cluster is written: temporary files libzim holds on to count.
+
+    libzim only closes a cluster when the next item of its kind (compressed or
+    not) wouldn't fit, so it may wait for more items before releasing any.
+    When all used space is handed over and could all be in its two open
+    clusters, reservations are let through: budget is exceeded by at most that.
+    A single file larger than the budget is always accepted (once the area is
+    empty) so it can't block forever.
+    Should nothing be released for stall_timeout seconds, we log and go over
+    budget rather than risking a deadlock.
+    Closing the area (build failed) fails pending and further reservations."""
+
+    def __init__(self, budget: int | None = None, stall_timeout: float = 300):
+        self.budget = budget
+        self.stall_timeout = stall_timeout
+        self.used = 0
+        self.peak = 0
+        # handed over to libzim, not written yet (part of used), and their sizes
+        self.held = 0
+        self.held_sizes = Counter()
+        self.released_on = time.monotonic()
+        self.closed = False
+        self.lock = threading.Condition()
+
+    @property
+    def is_bounded(self) -> bool:
+        return bool(self.budget)
+
+    def _fits(self, size: int) -> bool:
+        if not self.budget or not self.used or self.used + size <= self.budget:
+            return True
+        # nothing left to add: libzim may be waiting for more to close a cluster
+        return self.used == self.held and self.held <= self.open_clusters_bound
+
+    @property
+    def open_clusters_bound(self) -> int:
+        """most libzim may hold in its open clusters, given what's handed over
+
+        Each of the two open clusters holds under a cluster's size, or a single
+        larger item"""
+        largest = [
+            size
+            for size in heapq.nlargest(2, self.held_sizes)
+            for _ in range(min(self.held_sizes[size], 2))
+        ][:2]
+        return sum(max(size, CLUSTER_SIZE) for size in largest)
+
+    def reserve(self, size: int):
+        """reserve size bytes, blocking until it fits in the budget"""
+        with self.lock:
+            waiting_since = time.monotonic()
+            while not self.closed and not self._fits(size):
+                # other notifications (resize) are not progress
+                stalled_for = time.monotonic() - max(waiting_since, self.released_on)
+                if stalled_for >= self.stall_timeout:
+                    logger.warning(
+                        f"Staging area stalled at {self.used} bytes "
+                        f"for {self.stall_timeout}s. Going over budget"
+                    )
+                    break
+                self.lock.wait(timeout=self.stall_timeout - stalled_for)
+            if self.closed:
+                raise StagingClosedError("Staging area closed")
+            self._add(size)
+
+    def resize(self, reserved: int, size: int):
+        """update a reservation once the actual size is known (never blocks)"""
+        with self.lock:
+            self._add(size - reserved)
+            self.lock.notify_all()
+
+    def hand_over(self, size: int):
+        """account size bytes as held by libzim, until released once written"""
+        with self.lock:
+            self.held += size
+            self.held_sizes[size] += 1
+            self.lock.notify_all()
+
+    def release(self, size: int):
+        """give size bytes back to the budget (item written by Creator)"""
+        with self.lock:
+            self._add(-size)
+            if self.held_sizes[size]:
+                self.held -= size
+                self.held_sizes[size] -= 1
+                if not self.held_sizes[size]:
+                    del self.held_sizes[size]
+            self.released_on = time.monotonic()
+            self.lock.notify_all()
+
+    def close(self):
+        """fail pending and further reservations, waking blocked producers"""
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+
+    def _add(self, size: int):
+        self.used = max(self.used + size, 0)
+        self.peak = max(self.peak, self.used)
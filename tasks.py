@@ -41,6 +41,24 @@ def coverage(ctx: Context, args: str = "", *, html: bool = False):
     report_cov(ctx, html=html)
 
 
+@task(optional=["args"], help={"args": "benchmark additional arguments"})
+def bench(ctx: Context, args: str = ""):
+    """run end-to-end benchmark on a synthetic collection"""
+    ctx.run(f"python -m benchmarks.e2e {args}", pty=use_pty)
+
+
+@task(optional=["args"], help={"args": "micro-benchmarks additional arguments"})
+def bench_micro(ctx: Context, args: str = ""):
+    """run micro-benchmarks of scraper functions over growing collections"""
+    ctx.run(f"python -m benchmarks.micro {args}", pty=use_pty)
+
+
+@task(optional=["args"], help={"args": "reader benchmark additional arguments"})
+def bench_reader(ctx: Context, args: str = ""):
+    """run reader UI benchmark in Node over growing databases"""
+    ctx.run(f"python -m benchmarks.reader {args}", pty=use_pty)
+
+
 @task(optional=["args"], help={"args": "black additional arguments"})
 def lint_black(ctx: Context, args: str = "."):
     args = args or "."  # needed for hatch script
@@ -0,0 +1,27 @@
+import concurrent.futures
+import zipfile
+
+from nautiluszim.archive import ArchiveHandles
+
+
+def test_handle_per_thread(tmp_path):
+    fpath = tmp_path / "archive.zip"
+    with zipfile.ZipFile(fpath, "w", zipfile.ZIP_DEFLATED) as zh:
+        for index in range(32):
+            zh.writestr(f"{index}.txt", str(index) * 2**12)
+
+    def read(index: int) -> tuple[int, bool]:
+        zh = handles.get()
+        assert zh is handles.get()
+        return id(zh), zh.read(f"{index}.txt") == str(index).encode() * 2**12
+
+    with ArchiveHandles(fpath) as handles:
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(read, range(32)))
+        assert all(ok for _, ok in results)
+        opened = list(handles.handles)
+        # as many handles as threads which read
+        assert len({handle_id for handle_id, _ in results}) == len(opened)
+        assert len(opened) <= 4
+    assert not handles.handles
+    assert all(zh.fp is None for zh in opened)
@@ -0,0 +1,147 @@
+import http.server
+import threading
+
+import pytest
+from zimscraperlib.download import requests
+
+from nautiluszim.fetcher import Fetcher
+
+CONTENT = bytes(range(256)) * 2**10  # 4 chunks of the fetcher
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """serves CONTENT, misbehaving as instructed by the server's `script`
+
+    each request pops an action: `ok`, `503`, `truncate` (sends half the body
+    then closes) or `no-range` (ignores Range, sending whole content).
+    Content's ETag is the server's `etag`: Range is ignored if If-Range differs"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):  # noqa: N802
+        action = self.server.script.pop(0) if self.server.script else "ok"
+        self.server.requests.append(self.headers.get("Range"))
+        self.server.if_ranges.append(self.headers.get("If-Range"))
+        if action == "503":
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start = 0
+        if_range = self.headers.get("If-Range")
+        if (
+            self.headers.get("Range")
+            and action != "no-range"
+            and if_range in (None, self.server.etag)
+        ):
+            start = int(self.headers["Range"][6:-1])
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}"
+            )
+        else:
+            self.send_response(200)
+        body = CONTENT[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self.server.etag)
+        self.end_headers()
+        if action == "truncate":
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    server.script, server.requests, server.if_ranges = [], [], []
+    server.etag = '"v1"'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/file"
+
+
+def get_fetcher(**kwargs) -> Fetcher:
+    return Fetcher(backoff=0, read_timeout=5, **kwargs)
+
+
+def test_retries_server_errors(server, url):
+    server.script = ["503", "503"]
+    retries = []
+    fetcher = get_fetcher(on_retry=lambda: retries.append(1))
+    assert fetcher.fetch_content(url) == CONTENT
+    assert len(retries) == 2
+
+
+def test_gives_up_after_retries(server, url):
+    server.script = ["503"] * 3
+    with pytest.raises(requests.HTTPError):
+        get_fetcher(retries=2).check(url)
+
+
+def test_resumes_truncated_transfer(server, url, tmp_path):
+    server.script = ["truncate"]
+    fpath = tmp_path / "file"
+    assert get_fetcher().download(url, fpath) == server.etag
+    assert fpath.read_bytes() == CONTENT
+    assert server.requests == [None, f"bytes={len(CONTENT) // 2}-"]
+    assert server.if_ranges == [None, server.etag]
+
+
+def test_restarts_without_range_support(server, url, tmp_path):
+    server.script = ["truncate", "no-range"]
+    fpath = tmp_path / "file"
+    get_fetcher().download(url, fpath)
+    assert fpath.read_bytes() == CONTENT
+
+
+def test_continues_partial_file(server, url, tmp_path):
+    fpath = tmp_path / "file"
+    fpath.write_bytes(CONTENT[:1000])
+    get_fetcher().download(url, fpath, validator=server.etag)
+    assert fpath.read_bytes() == CONTENT
+    assert server.requests == ["bytes=1000-"]
+
+
+def test_restarts_changed_partial_file(server, url, tmp_path):
+    fpath = tmp_path / "file"
+    fpath.write_bytes(b"x" * 1000)
+    get_fetcher().download(url, fpath, validator='"v0"')
+    assert fpath.read_bytes() == CONTENT
+    assert server.requests == ["bytes=1000-"]
+    assert server.if_ranges == ['"v0"']
+
+
+@pytest.mark.parametrize("size", [1000, len(CONTENT)])
+def test_overwrites_file_without_validator(server, url, tmp_path, size):
+    fpath = tmp_path / "file"
+    fpath.write_bytes(b"x" * size)
+    get_fetcher().download(url, fpath)
+    assert fpath.read_bytes() == CONTENT
+    assert server.requests == [None]
+
+
+def test_checks_expected_size(url, tmp_path):
+    fpath = tmp_path / "file"
+    with pytest.raises(ValueError, match="Unexpected size"):
+        get_fetcher().download(url, fpath, expected_size=10)
+    assert fpath.stat().st_size == 0
+
+
+def test_session_per_thread():
+    fetcher = get_fetcher()
+    sessions = [fetcher.session]
+    thread = threading.Thread(target=lambda: sessions.append(fetcher.session))
+    thread.start()
+    thread.join()
+    assert sessions[0] is fetcher.session
+    assert sessions[1] is not sessions[0]
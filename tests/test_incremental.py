@@ -0,0 +1,94 @@
+import io
+import json
+
+import pytest
+from zimscraperlib.zim.creator import Creator
+
+from nautiluszim.incremental import (
+    MANIFEST_METADATA,
+    RECOMPRESS_KEY,
+    PreviousZim,
+    write_item_content,
+)
+
+CONTENT = b"hello" * 2**18  # over a copy chunk
+
+
+@pytest.fixture
+def previous_zim(tmp_path):
+    fpath = tmp_path / "previous.zim"
+    manifest = {
+        "files/a.txt": {"uri": "a.txt", "size": len(CONTENT), "crc32": 1234},
+        "files/empty.txt": {"uri": "empty.txt", "size": 0, "crc32": 0},
+        "files/b.txt": {"uri": "https://x.org/b.txt", "size": len(CONTENT)},
+        "files/c.jpg": {
+            "uri": "c.jpg",
+            "size": 1000,
+            "crc32": 99,
+            RECOMPRESS_KEY: "JpegLow/1",
+        },
+    }
+    creator = Creator(fpath, main_path="files/a.txt").config_dev_metadata()
+    creator.start()
+    for path in manifest:
+        creator.add_item_for(
+            path, content=b"" if "empty" in path else CONTENT, mimetype="text/plain"
+        )
+    creator.add_metadata(
+        MANIFEST_METADATA, json.dumps(manifest), mimetype="application/json"
+    )
+    creator.finish()
+    return PreviousZim(fpath)
+
+
+def test_reused_on_same_path_uri_and_fingerprint(previous_zim):
+    fingerprint = {"size": len(CONTENT), "crc32": 1234}
+    item = previous_zim.get_item("files/a.txt", "a.txt", fingerprint)
+    assert item is not None
+    buffer = io.BytesIO()
+    write_item_content(item, buffer)
+    assert buffer.getvalue() == CONTENT
+
+
+def test_empty_file_reused(previous_zim):
+    fingerprint = {"size": 0, "crc32": 0}
+    assert previous_zim.get_item("files/empty.txt", "empty.txt", fingerprint)
+
+
+@pytest.mark.parametrize(
+    "path, uri, fingerprint",
+    [
+        ("files/other.txt", "a.txt", {"size": len(CONTENT), "crc32": 1234}),
+        ("files/a.txt", "other.txt", {"size": len(CONTENT), "crc32": 1234}),
+        ("files/a.txt", "a.txt", {"size": len(CONTENT), "crc32": 4321}),
+        ("files/a.txt", "a.txt", {"size": 10, "crc32": 1234}),
+    ],
+)
+def test_not_reused_on_mismatch(previous_zim, path, uri, fingerprint):
+    assert previous_zim.get_item(path, uri, fingerprint) is None
+
+
+def test_not_reused_without_strong_key(previous_zim):
+    fingerprint = {"size": len(CONTENT)}
+    assert (
+        previous_zim.get_item("files/b.txt", "https://x.org/b.txt", fingerprint) is None
+    )
+
+
+def test_recompressed_size_not_checked(previous_zim):
+    # item is smaller than its source once recompressed
+    fingerprint = {"size": 1000, "crc32": 99, RECOMPRESS_KEY: "JpegLow/1"}
+    assert previous_zim.get_item("files/c.jpg", "c.jpg", fingerprint)
+    fingerprint[RECOMPRESS_KEY] = "JpegMedium/1"
+    assert previous_zim.get_item("files/c.jpg", "c.jpg", fingerprint) is None
+
+
+def test_no_manifest(tmp_path):
+    fpath = tmp_path / "previous.zim"
+    creator = Creator(fpath, main_path="files/a.txt").config_dev_metadata()
+    creator.start()
+    creator.add_item_for("files/a.txt", content=CONTENT, mimetype="text/plain")
+    creator.finish()
+    previous_zim = PreviousZim(fpath)
+    assert previous_zim.manifest == {}
+    assert previous_zim.get_item("files/a.txt", "a.txt", {"crc32": 1234}) is None
@@ -0,0 +1,41 @@
+from nautiluszim.journal import ADDED, DOWNLOADED, PLANNED, Journal
+
+
+def test_journal_resume(tmp_path):
+    journal = Journal(tmp_path / "journal.jsonl")
+    journal.open()
+    fpath = tmp_path / "file"
+    fpath.write_bytes(b"content")
+    journal.record("http://a", PLANNED)
+    journal.record("http://b", PLANNED)
+    journal.record_download("http://a", fpath)
+    journal.record("http://a", ADDED)
+    journal.close()
+
+    # simulate a crash while writing a record
+    with open(journal.fpath, "a") as fh:
+        fh.write('{"uri": "http://b", "sta')
+
+    journal = Journal(tmp_path / "journal.jsonl")
+    journal.open()
+    assert journal.get("http://a")["state"] == ADDED
+    assert journal.get("http://a")["size"] == len(b"content")
+    assert journal.get("http://b")["state"] == PLANNED
+    assert journal.get_downloaded("http://a") == fpath
+    assert journal.get_downloaded("http://b") is None
+    journal.record("http://b", DOWNLOADED)
+    journal.close()
+
+    journal.load()
+    assert journal.get("http://b")["state"] == DOWNLOADED
+
+
+def test_journal_altered_download(tmp_path):
+    journal = Journal(tmp_path / "journal.jsonl")
+    fpath = tmp_path / "file"
+    fpath.write_bytes(b"content")
+    journal.record_download("http://a", fpath)
+    fpath.write_bytes(b"CONTENT")
+    assert journal.get_downloaded("http://a") is None
+    fpath.unlink()
+    assert journal.get_downloaded("http://a") is None
@@ -0,0 +1,39 @@
+import json
+
+from nautiluszim.metrics import BuildMetrics
+from nautiluszim.prometheus import format_metrics
+
+
+def test_metrics_report(tmp_path):
+    metrics = BuildMetrics()
+    metrics.start_phase("first")
+    metrics.count("archive", bytes_in=10, bytes_out=8)
+    metrics.count("archive", bytes_in=10, bytes_out=8)
+    metrics.start_phase("second")
+    metrics.count("download", items=3, bytes_in=30, bytes_out=30)
+    metrics.end_phase()
+
+    assert list(metrics.phases.keys()) == ["first", "second"]
+    assert metrics.phases["first"]["items"] == 2
+    assert metrics.phases["second"]["bytes_out"] == 30
+    assert metrics.total("bytes_in") == 50
+
+    fpath = tmp_path / "report.json"
+    metrics.write_report(fpath, zim_size=1)
+    report = json.loads(fpath.read_text())
+    assert report["zim_size"] == 1
+    assert report["categories"]["archive"]["bytes_out"] == 16
+    assert report["phases"]["first"]["max_rss"] > 0
+
+
+def test_prometheus_format():
+    metrics = BuildMetrics()
+    metrics.start_phase("files")
+    metrics.count("download", bytes_in=10, bytes_out=10)
+    metrics.count("previous_zim", bytes_in=5, bytes_out=5)
+    text = format_metrics(metrics, name='my "zim"', files_total=2)
+    assert 'nautilus_build_info{name="my \\"zim\\"",phase="files"} 1' in text
+    assert "nautilus_downloaded_bytes_total 10\n" in text
+    assert 'nautilus_cache_hits_total{source="previous_zim"} 1\n' in text
+    assert 'nautilus_phase_duration_seconds{phase="files"}' in text
+    assert "\nnautilus_zim_size_bytes " not in text
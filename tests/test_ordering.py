@@ -0,0 +1,24 @@
+from nautiluszim.entries import FileEntry
+from nautiluszim.ordering import UNKNOWN_SIZE_CLASS, size_class, sort_for_locality
+
+
+def test_size_class():
+    assert size_class(0) == 0
+    assert size_class(2**20) == 1
+    assert size_class(2**20 + 1) == 2
+    assert size_class(2**40) == UNKNOWN_SIZE_CLASS - 1
+    assert size_class(None) == UNKNOWN_SIZE_CLASS
+
+
+def test_sort_for_locality():
+    entries = [
+        FileEntry(index=0, uri="video.mp4", filename="video.mp4", size=2**30),
+        FileEntry(index=1, uri="b/notes.txt", filename="b/notes.txt", size=100),
+        FileEntry(index=2, uri="big.pdf", filename="big.pdf", size=2**25),
+        FileEntry(index=3, uri="a/notes.txt", filename="a/notes.txt", size=200),
+        FileEntry(index=4, uri="small.pdf", filename="small.pdf", size=2**10),
+        FileEntry(index=5, uri="http://x/y.pdf", filename="y.pdf"),
+    ]
+    assert [entry.index for entry in sort_for_locality(entries)] == [3, 1, 4, 2, 5, 0]
+    # source list is left untouched
+    assert [entry.index for entry in entries] == [0, 1, 2, 3, 4, 5]
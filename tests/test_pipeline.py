@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from nautiluszim.entries import FileEntry, StagedFile
+from nautiluszim.pipeline import FilesPipeline
+from nautiluszim.staging import StagingArea
+
+
+def get_entries(nb: int) -> list[FileEntry]:
+    return [FileEntry(index, f"{index}.txt", f"{index}.txt") for index in range(nb)]
+
+
+def reserve(_):
+    pass
+
+
+def stage(entry: FileEntry) -> StagedFile:
+    # later entries are fetched faster, completing out of order
+    time.sleep(0.01 * (5 - entry.index % 5))
+    return StagedFile(category="archive", size=entry.index)
+
+
+def test_adds_in_order_from_single_thread():
+    added, threads = [], set()
+
+    def add(entry, staged):
+        added.append((entry.index, staged.size))
+        threads.add(threading.current_thread().name)
+
+    pipeline = FilesPipeline(reserve=reserve, stage=stage, add=add, workers=4)
+    asyncio.run(pipeline.run(get_entries(20)))
+    assert added == [(index, index) for index in range(20)]
+    assert len(threads) == 1
+
+
+def test_transforms_and_errors():
+    def verify(entry, _):
+        if entry.index == 7:
+            raise ValueError("bad size")
+
+    added = []
+    pipeline = FilesPipeline(
+        reserve=reserve,
+        stage=stage,
+        verify=verify,
+        transforms=[lambda _, staged: StagedFile("transformed", staged.size * 2)],
+        add=lambda _, staged: added.append(staged),
+        workers=2,
+    )
+    with pytest.raises(ValueError, match="bad size"):
+        asyncio.run(pipeline.run(get_entries(20)))
+    assert [staged.size for staged in added] == [index * 2 for index in range(7)]
+    assert {staged.category for staged in added} == {"transformed"}
+
+
+def test_transforms_in_own_workers():
+    threads = set()
+
+    def transform(_, staged):
+        threads.add(threading.current_thread().name)
+        return staged
+
+    added = []
+    pipeline = FilesPipeline(
+        reserve=reserve,
+        stage=stage,
+        transforms=[transform],
+        add=lambda entry, _: added.append(entry.index),
+        workers=2,
+        transform_workers=2,
+    )
+    asyncio.run(pipeline.run(get_entries(10)))
+    assert added == list(range(10))
+    assert {name.split("_")[0] for name in threads} == {"transforms"}
+
+
+def test_staging_budget_honored():
+    staging = StagingArea(budget=30, stall_timeout=5)
+    peaks = []
+
+    def add(_, staged):
+        peaks.append(staging.used)
+        staging.release(staged.size)
+
+    pipeline = FilesPipeline(
+        reserve=lambda _: staging.reserve(10),
+        stage=lambda _: StagedFile(category="archive", size=10),
+        add=add,
+        workers=4,
+    )
+    asyncio.run(pipeline.run(get_entries(20)))
+    assert len(peaks) == 20
+    assert staging.peak <= 30
+    assert staging.used == 0
+
+
+def test_failure_wakes_blocked_reserve():
+    staging = StagingArea(budget=10, stall_timeout=30)
+
+    def add(*_):
+        # next entry's reservation is blocked meanwhile (nothing released)
+        time.sleep(0.1)
+        raise ValueError("add failed")
+
+    pipeline = FilesPipeline(
+        reserve=lambda _: staging.reserve(10),
+        stage=lambda _: StagedFile(category="archive", size=10),
+        add=add,
+        cancel=staging.close,
+    )
+    start = time.monotonic()
+    with pytest.raises(ValueError, match="add failed"):
+        asyncio.run(pipeline.run(get_entries(5)))
+    assert time.monotonic() - start < 5
@@ -0,0 +1,42 @@
+import json
+
+from nautiluszim.progress import ProgressFile
+
+
+def test_progress_rate_limited(tmp_path):
+    fpath = tmp_path / "stats.json"
+    progress = ProgressFile(fpath, interval=3600)
+    progress.update(phase="files", done=0, total=10)
+    assert json.loads(fpath.read_text())["done"] == 0
+
+    # within interval: skipped unless forced or phase changed
+    progress.update(phase="files", done=5, total=10)
+    assert json.loads(fpath.read_text())["done"] == 0
+    progress.update(phase="files", done=6, total=10, force=True)
+    stats = json.loads(fpath.read_text())
+    assert stats["done"] == 6
+    assert stats["eta"] is not None
+    progress.update(phase="finish", done=10, total=10)
+    assert json.loads(fpath.read_text())["phase"] == "finish"
+    assert list(tmp_path.iterdir()) == [fpath]
+
+
+def test_progress_rate_kept_after_files(tmp_path):
+    fpath = tmp_path / "stats.json"
+    progress = ProgressFile(fpath, interval=3600)
+    progress.update(phase="files", done=0, total=10, total_bytes=100)
+    # not written (within interval) but accounted for
+    progress.update(phase="files", done=10, total=10, done_bytes=100)
+    assert json.loads(fpath.read_text())["items_per_second"] == 0
+
+    progress.update(phase="finish", done=10, total=10, done_bytes=100)
+    stats = json.loads(fpath.read_text())
+    assert stats["phase"] == "finish"
+    assert stats["items_per_second"] > 0
+    assert stats["bytes_per_second"] > 0
+    assert stats["eta"] == 0
+
+    progress.update(phase="done", done=10, total=10, done_bytes=100)
+    assert (
+        json.loads(fpath.read_text())["items_per_second"] == stats["items_per_second"]
+    )
@@ -0,0 +1,45 @@
+import io
+
+from PIL import Image
+
+from nautiluszim.entries import FileEntry, StagedFile
+from nautiluszim.recompress import Recompressor
+
+
+def get_jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.radial_gradient("L").resize((512, 512)).convert("RGB").save(
+        buffer, "JPEG", quality=100
+    )
+    return buffer.getvalue()
+
+
+def test_recompress_in_memory_and_on_disk(tmp_path):
+    recompressor = Recompressor("low", tmp_path)
+    entry = FileEntry(0, "image.jpg", "image.jpg")
+    content = get_jpeg()
+
+    staged = StagedFile("archive", len(content), content=content)
+    recompressed = recompressor.recompress(entry, staged)
+    assert recompressed.content is not None
+    assert recompressed.size == len(recompressed.content) < len(content)
+    assert recompressed.source_size == len(content)
+
+    fpath = tmp_path / "staged"
+    fpath.write_bytes(content)
+    recompressed = recompressor.recompress(
+        entry, StagedFile("archive", len(content), fpath=fpath)
+    )
+    assert not fpath.exists()
+    assert recompressed.fpath and recompressed.fpath.stat().st_size < len(content)
+    # only the recompressed file is left
+    assert list(tmp_path.iterdir()) == [recompressed.fpath]
+
+
+def test_kept_if_unsupported_or_failing(tmp_path):
+    recompressor = Recompressor("low", tmp_path)
+    staged = StagedFile("archive", 4, content=b"text")
+    assert recompressor.recompress(FileEntry(0, "a.txt", "a.txt"), staged) is staged
+    # not an actual PNG
+    assert recompressor.recompress(FileEntry(0, "a.png", "a.png"), staged) is staged
+    assert not list(tmp_path.iterdir())
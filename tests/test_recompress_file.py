@@ -0,0 +1,220 @@
+import json
+import pathlib
+import subprocess
+import zipfile
+
+import pytest
+import recompress_file
+from recompress_file import AUDIO, FALLBACK_IGNORE, JPEG, PNG, VIDEO, Compressor
+
+EPUB_MEMBERS = {
+    "META-INF/container.xml": b"<container/>" * 100,
+    "mimetype": b"application/epub+zip",
+    "OEBPS/chapter.xhtml": b"<html/>" * 100,
+    "OEBPS/cover.png": b"png" * 100,
+    "OEBPS/photo.jpg": b"jpg" * 100,
+    "OEBPS/audio.mp3": b"mp3" * 100,
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_tool_versions():
+    recompress_file.get_tool_version.cache_clear()
+    yield
+    recompress_file.get_tool_version.cache_clear()
+
+
+@pytest.fixture
+def missing_tools(monkeypatch):
+    def run_args(args):
+        raise FileNotFoundError(f"No such file or directory: '{args[0]}'")
+
+    monkeypatch.setattr(recompress_file, "run_args", run_args)
+
+
+@pytest.mark.usefixtures("missing_tools")
+def test_epub_kept_whole_when_tools_fail(tmp_path):
+    src_path, dst_path = tmp_path / "src.epub", tmp_path / "dst.epub"
+    with zipfile.ZipFile(src_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, content in EPUB_MEMBERS.items():
+            zf.writestr(name, content)
+
+    recompress_file.Compressor.recompress_epub(src_path, dst_path, "default", 2)
+
+    with zipfile.ZipFile(dst_path) as zf:
+        infos = zf.infolist()
+        assert [info.filename for info in infos] == [
+            "mimetype",
+            "META-INF/container.xml",
+            "OEBPS/chapter.xhtml",
+            "OEBPS/cover.png",
+            "OEBPS/photo.jpg",
+            "OEBPS/audio.mp3",
+        ]
+        assert {
+            info.filename for info in infos if info.compress_type == zipfile.ZIP_STORED
+        } == {"mimetype", "OEBPS/cover.png", "OEBPS/photo.jpg", "OEBPS/audio.mp3"}
+        # members that couldn't be recompressed are kept as is
+        assert {info.filename: zf.read(info) for info in infos} == EPUB_MEMBERS
+
+
+class FakeTools:
+    """stands for external tools run through run_args, recording their names
+
+    (but for version queries)"""
+
+    def __init__(self):
+        self.calls = []
+        self.version = "1.0"
+        self.ffprobe = {"format": {}, "streams": []}
+        self.identify = "90 TrueColor"
+        # size of recompressed output, relative to source
+        self.ratio = 0.5
+
+    def __call__(self, args):
+        tool = args[0]
+        if args[1:] in (["--version"], ["-version"]):
+            return subprocess.CompletedProcess(args, 0, f"{tool} {self.version}", "")
+        self.calls.append(tool)
+        stdout = ""
+        if tool == "ffprobe":
+            stdout = json.dumps(self.ffprobe)
+        elif tool == "identify":
+            stdout = self.identify
+        elif tool == "jpegoptim":
+            src_path = pathlib.Path(args[-1])
+            dest = next(arg for arg in args if arg.startswith("--dest="))
+            pathlib.Path(dest[7:]).joinpath(src_path.name).write_bytes(
+                b"j" * int(src_path.stat().st_size * self.ratio)
+            )
+        return subprocess.CompletedProcess(args, 0, stdout=stdout, stderr="")
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    tools = FakeTools()
+    monkeypatch.setattr(recompress_file, "run_args", tools)
+    return tools
+
+
+def test_probe_audio_video(tools, tmp_path):
+    tools.ffprobe = {
+        "format": {"bit_rate": "240000"},
+        "streams": [
+            {"codec_type": "video", "codec_name": "vp8", "width": 426, "height": 240},
+            {"codec_type": "audio", "codec_name": "vorbis"},
+            {"codec_type": "audio", "codec_name": "mp3"},
+            {"codec_type": "subtitle", "codec_name": "webvtt"},
+        ],
+    }
+    assert recompress_file.probe_media(VIDEO, tmp_path / "a.webm") == {
+        "bit_rate": 240000,
+        "video_codec": "vp8",
+        "width": 426,
+        "height": 240,
+        "audio_codec": "vorbis",
+    }
+
+
+@pytest.mark.parametrize(
+    "output, probe",
+    [
+        ("92 TrueColor", {"quality": 92, "palette": False}),
+        ("100 PaletteAlpha", {"quality": 100, "palette": True}),
+        ("garbage", {}),
+    ],
+)
+def test_probe_image(tools, tmp_path, output, probe):
+    tools.identify = output
+    assert recompress_file.probe_media(JPEG, tmp_path / "a.jpg") == probe
+
+
+@pytest.mark.parametrize(
+    "target, preset, probe, meets",
+    [
+        (AUDIO, "mp3-48k", {"audio_codec": "mp3", "bit_rate": 40_000}, True),
+        # within tolerance
+        (AUDIO, "mp3-48k", {"audio_codec": "mp3", "bit_rate": 52_000}, True),
+        (AUDIO, "mp3-48k", {"audio_codec": "mp3", "bit_rate": 128_000}, False),
+        (AUDIO, "mp3-48k", {"audio_codec": "vorbis", "bit_rate": 40_000}, False),
+        (AUDIO, "mp3-48k", {"audio_codec": "mp3"}, False),
+        (VIDEO, "240p", {"video_codec": "vp8", "height": 240, "bit_rate": 1}, True),
+        (VIDEO, "240p", {"video_codec": "vp8", "height": 720, "bit_rate": 1}, False),
+        (JPEG, "low", {"quality": 20}, True),
+        (JPEG, "low", {"quality": 90}, False),
+        (PNG, "low", {"palette": True}, True),
+        (PNG, "low", {"palette": False}, False),
+        (JPEG, "low", {}, False),
+    ],
+)
+def test_meets_preset(target, preset, probe, meets):
+    assert recompress_file.meets_preset(target, preset, probe) is meets
+
+
+def recompress(src_path, previous=None):
+    compressor = Compressor(
+        src_path,
+        src_path.parent / "dst",
+        keep_ext=False,
+        fallback=FALLBACK_IGNORE,
+        force=False,
+        presets={JPEG: "low"},
+        previous=previous,
+    )
+    assert compressor.run() == 0
+    return compressor
+
+
+@pytest.fixture
+def jpeg(tmp_path):
+    src_path = tmp_path / "src" / "a.jpg"
+    src_path.parent.mkdir()
+    src_path.write_bytes(b"x" * 1000)
+    return src_path
+
+
+def test_kept_when_below_preset(tools, jpeg):
+    tools.identify = "20 TrueColor"
+    compressor = recompress(jpeg, previous={})
+    assert "jpegoptim" not in tools.calls
+    assert compressor.dst_path.read_bytes() == jpeg.read_bytes()
+    assert compressor.record["kept_source"]
+    assert compressor.record["probe"] == {"quality": 20, "palette": False}
+
+
+def test_recompressed_when_above_preset(tools, jpeg):
+    compressor = recompress(jpeg, previous={})
+    assert tools.calls.count("jpegoptim") == 1
+    assert compressor.dst_path.stat().st_size == 500
+    assert compressor.record["gain"]
+    assert not compressor.record["kept_source"]
+
+
+def test_cache_invalidated_by_tool_version(tools, jpeg):
+    record = recompress(jpeg, previous={}).record
+    assert "jpegoptim 1.0" in record["tools"]
+    assert "identify 1.0" in record["tools"]
+
+    # same source, settings and tools
+    tools.calls.clear()
+    recompress(jpeg, previous=record)
+    assert tools.calls == []  # skipped: neither probed nor recompressed
+
+    tools.version = "2.0"
+    recompress_file.get_tool_version.cache_clear()
+    tools.calls.clear()
+    assert recompress(jpeg, previous=record).record["tools"] != record["tools"]
+    assert "jpegoptim" in tools.calls
+
+
+def test_no_gain_not_tried_again(tools, jpeg):
+    tools.ratio = 1.5
+    record = recompress(jpeg, previous={}).record
+    assert record["kept_source"]
+    assert not record["gain"]
+
+    tools.calls.clear()
+    compressor = recompress(jpeg, previous=record)
+    # neither recompressed nor probed again
+    assert tools.calls == []
+    assert compressor.dst_path.read_bytes() == jpeg.read_bytes()
@@ -0,0 +1,210 @@
+import concurrent.futures
+import logging
+import threading
+
+import pytest
+import recompress_tree
+from recompress_file import EPUB, FAILED, JPEG, PNG, VIDEO
+from recompress_tree import (
+    VIDEO_JOB_MEMORY,
+    JobSlots,
+    Manifest,
+    ManifestFile,
+    TexasRanger,
+)
+
+SOURCES = {
+    "small.png": 100,
+    "movie.mp4": 3000,
+    "sub/big.png": 2000,
+    "doc.pdf": 500,
+    "bad.jpg": 300,
+}
+
+
+def test_slots_bounded_by_cores():
+    slots = JobSlots(8, video_threads=4)
+    assert slots.video_slots == 2
+    assert slots.take(VIDEO) == 4
+    assert slots.take(VIDEO) == 4
+    assert not slots.fits(VIDEO)
+    assert not slots.fits(PNG)
+    slots.release(VIDEO)
+    assert slots.fits(PNG)
+    assert slots.fits(VIDEO)
+    assert slots.used == 4
+    assert slots.videos == 1
+
+
+def test_video_slots_bounded_by_memory():
+    slots = JobSlots(8, video_threads=4, memory=VIDEO_JOB_MEMORY)
+    assert slots.video_slots == 1
+    slots.take(VIDEO)
+    # cores are left but not memory
+    assert not slots.fits(VIDEO)
+    assert slots.fits(PNG)
+
+
+def test_cores_kept_for_waiting_videos():
+    slots = JobSlots(8, video_threads=4)
+    for _ in range(4):
+        slots.take(PNG)
+    assert not slots.fits(PNG, videos_waiting=1)
+    assert slots.fits(PNG, videos_waiting=0)
+    assert slots.fits(VIDEO, videos_waiting=1)
+
+
+def test_heavy_job_runs_alone_on_few_cores():
+    slots = JobSlots(2, video_threads=4)
+    assert slots.get_threads(VIDEO) == 2
+    assert slots.get_threads(EPUB) <= 2
+    slots.take(PNG)
+    assert not slots.fits(VIDEO)
+    slots.release(PNG)
+    assert slots.fits(VIDEO)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    src_path = tmp_path / "src"
+    for name, size in SOURCES.items():
+        fpath = src_path / name
+        fpath.parent.mkdir(parents=True, exist_ok=True)
+        fpath.write_bytes(b"x" * size)
+    return src_path
+
+
+@pytest.fixture
+def thread_workers(monkeypatch):
+    # workers don't need to be processes, and stubs wouldn't reach them
+    monkeypatch.setattr(
+        concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor
+    )
+
+
+@pytest.fixture
+def started(monkeypatch, thread_workers):  # noqa: ARG001
+    """names of files handled, in order, by a stub failing on bad.jpg"""
+    started = []
+    lock = threading.Lock()
+
+    def handle_file(src_path, dst_path, compressor_kwargs, previous):  # noqa: ARG001
+        with lock:
+            started.append(src_path.name)
+        returncode = 1 if src_path.name == "bad.jpg" else 0
+        return returncode, 0.0, None, src_path.stat().st_size // 2, {}
+
+    monkeypatch.setattr(recompress_tree, "handle_file", handle_file)
+    monkeypatch.setattr(recompress_tree, "get_available_memory", lambda: None)
+    return started
+
+
+def get_ranger(tree, **kwargs):
+    return TexasRanger(
+        tree,
+        tree.parent / "dst",
+        "",
+        False,
+        jobs=1,
+        cache_path=tree.parent / "cache.jsonl",
+        **kwargs,
+    )
+
+
+def test_costliest_first(tree, started):
+    manifest = get_ranger(tree).scan()
+    get_ranger(tree).recompress_all(manifest)
+    # video, then by size weighted by type's cost
+    assert started == ["movie.mp4", "doc.pdf", "big.png", "bad.jpg", "small.png"]
+    assert {item.src_path.name: item.dst_size for item in manifest.files} == {
+        name.split("/")[-1]: size // 2 for name, size in SOURCES.items()
+    }
+    assert manifest.done == len(SOURCES)
+
+
+def test_failure_retried_unless_skipped(tree, started):
+    ranger = get_ranger(tree)
+    assert ranger.run() == 1
+    assert ranger.cache.get_state(tree / "bad.jpg") == FAILED
+    assert "bad.jpg" in started
+
+    started.clear()
+    assert get_ranger(tree).run() == 1
+    assert "bad.jpg" in started
+
+    started.clear()
+    assert get_ranger(tree, skip_failed=True).run() == 0
+    assert sorted(started) == sorted(
+        name.split("/")[-1] for name in SOURCES if name != "bad.jpg"
+    )
+
+
+RATIOS = {
+    PNG: {"high": 0.5, "medium": 0.3, "low": 0.1},
+    JPEG: {"high": 0.6, "low": 0.2},
+}
+
+
+def plan_presets(tmp_path, budget):
+    """presets planned for 1000 bytes of PNG, 1000 of JPEG and 100 others"""
+    manifest = Manifest(
+        [
+            ManifestFile(tmp_path / "a.png", 600, PNG, 0),
+            ManifestFile(tmp_path / "b.png", 400, PNG, 0),
+            ManifestFile(tmp_path / "c.jpg", 1000, JPEG, 0),
+            ManifestFile(tmp_path / "d.txt", 100, None, 0),
+        ]
+    )
+    ranger = TexasRanger(tmp_path, tmp_path / "dst", "", False, budget=budget)
+    ranger.estimate_ratios = lambda _: RATIOS
+    return ranger.plan_presets(manifest)
+
+
+@pytest.mark.parametrize(
+    "budget, presets",
+    [
+        # mixes from ~400 (low, low) to ~1200 bytes (high, high)
+        (1000, {JPEG: "high", PNG: "medium"}),
+        (1100, {JPEG: "high", PNG: "medium"}),
+        (1200, {JPEG: "high", PNG: "high"}),
+        (600, {JPEG: "low", PNG: "medium"}),
+    ],
+)
+def test_plan_keeps_most_within_budget(tmp_path, budget, presets):
+    assert plan_presets(tmp_path, budget) == presets
+
+
+def test_plan_smallest_if_none_fits(tmp_path, caplog):
+    assert plan_presets(tmp_path, 300) == {JPEG: "low", PNG: "low"}
+    assert "No presets fit" in caplog.text
+
+
+@pytest.mark.usefixtures("thread_workers")
+def test_plan_only(tmp_path, monkeypatch, caplog):
+    src_path = tmp_path / "src"
+    src_path.mkdir()
+    for index, size in enumerate((100, 200, 300, 400, 500)):
+        src_path.joinpath(f"{index}.png").write_bytes(b"x" * size)
+    sampled = []
+
+    def estimate_file(src_path, _work_dir, _compressor_kwargs, target, preset):
+        sampled.append((src_path.name, preset))
+        return int(src_path.stat().st_size * RATIOS[target][preset])
+
+    monkeypatch.setattr(recompress_tree, "estimate_file", estimate_file)
+    monkeypatch.setattr(recompress_tree, "handle_file", None)  # not recompressing
+    ranger = TexasRanger(
+        src_path, tmp_path / "dst", "", False, budget=400, sample_size=2, plan_only=True
+    )
+    caplog.set_level(logging.INFO)
+    assert ranger.run() == 0
+
+    # smallest and largest files, with each preset
+    assert sorted(sampled) == sorted(
+        (name, preset) for name in ("0.png", "4.png") for preset in RATIOS[PNG]
+    )
+    # 1500 bytes: high ~750, medium ~450, low ~150
+    assert "png medium: 1.46 KiB -> ~450.0 bytes" in caplog.text
+    assert "(budget 400 bytes): png=low" in caplog.text
+    assert ranger.compressor_kwargs["presets"][PNG] == "low"
+    assert not [fpath for fpath in (tmp_path / "dst").iterdir() if fpath.is_file()]
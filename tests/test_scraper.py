@@ -0,0 +1,141 @@
+import json
+import pstats
+import threading
+import time
+import zipfile
+
+import pytest
+
+from nautiluszim import scraper as scraper_module
+from nautiluszim.scraper import Nautilus
+
+SMALL, LARGE = b"s" * 100, b"L" * 4096
+
+
+class RecordingCreator:
+    """stands for libzim's Creator, recording add_item_for() arguments by path
+
+    Items are only written (callbacks called) on write()"""
+
+    def __init__(self):
+        self.items = {}
+
+    def add_item_for(self, path, **kwargs):
+        self.items[path] = kwargs
+
+    def write(self):
+        for kwargs in self.items.values():
+            func, *args = kwargs["callback"]
+            func(*args)
+
+
+@pytest.fixture
+def get_scraper(tmp_path, monkeypatch):
+    # translations are not what we test, whatever locales the host has
+    monkeypatch.setattr(scraper_module, "setlocale", lambda *_: None)
+
+    archive = tmp_path / "archive.zip"
+    with zipfile.ZipFile(archive, "w") as zh:
+        zh.writestr("small.txt", SMALL)
+        zh.writestr("large.bin", LARGE)
+    collection = tmp_path / "collection.json"
+    collection.write_text(
+        json.dumps([{"title": "Item", "files": ["small.txt", "large.bin"]}])
+    )
+
+    def get_scraper(**kwargs) -> Nautilus:
+        return Nautilus(
+            str(archive),
+            str(collection),
+            10,
+            False,
+            False,
+            str(tmp_path / "output"),
+            "test.zim",
+            False,
+            False,
+            "eng",
+            "en",
+            "test",
+            "test_en_all",
+            "Test",
+            "Tester",
+            "Tester",
+            **kwargs,
+        )
+
+    return get_scraper
+
+
+def test_in_memory_threshold(get_scraper):
+    scraper = get_scraper(in_memory_threshold=1)
+    scraper.make_build_folder()
+    scraper.test_archive_collection()
+    scraper.zim_creator = RecordingCreator()
+    scraper.process_collection_entries(scraper.get_file_entries())
+
+    small = scraper.zim_creator.items["files/small.txt"]
+    assert small["content"] == SMALL
+    assert small["fpath"] is None
+
+    large = scraper.zim_creator.items["files/large.bin"]
+    assert large["content"] is None
+    assert large["fpath"].read_bytes() == LARGE
+    # no temporary file for the small one
+    assert {
+        fpath.name for fpath in scraper.build_dir.iterdir() if fpath.suffix != ".png"
+    } == {"large.bin"}
+
+
+def test_staging_released_once_written(get_scraper):
+    scraper = get_scraper(staging_budget=1)
+    scraper.make_build_folder()
+    scraper.test_archive_collection()
+    scraper.zim_creator = RecordingCreator()
+    scraper.process_collection_entries(scraper.get_file_entries())
+    # handed over to libzim but not written yet
+    assert scraper.staging.used == len(SMALL) + len(LARGE)
+    assert scraper.staging.held == scraper.staging.used
+    scraper.zim_creator.write()
+    assert scraper.staging.used == 0
+    assert scraper.staging.held == 0
+
+
+def test_in_memory_threshold_capped_by_staging_budget(get_scraper):
+    assert get_scraper(in_memory_threshold=4096).in_memory_threshold == 2**22
+    scraper = get_scraper(in_memory_threshold=4096, staging_budget=1)
+    assert scraper.in_memory_threshold == 2**20
+
+
+def test_profile_covers_files_workers(get_scraper):
+    scraper = get_scraper(profile=True, workers=2)
+    scraper.make_build_folder()
+    scraper.test_archive_collection()
+    scraper.zim_creator = RecordingCreator()
+    scraper.start_phase("files")
+    scraper.process_collection_entries(scraper.get_file_entries())
+    scraper.end_phase()
+
+    stats = pstats.Stats(str(scraper.output_dir / "profiles" / "01_files.prof"))
+    functions = {name for _, _, name in stats.stats}  # pyright: ignore
+    assert {"stage_file_entry", "add_staged_file"} <= functions
+
+
+def test_download_delay_shared_by_workers(get_scraper):
+    scraper = get_scraper(download_delay=0.1, workers=4)
+    started_on = []
+
+    def download():
+        scraper.sleep_before_download()
+        started_on.append(time.monotonic())
+
+    threads = [threading.Thread(target=download) for _ in range(4)]
+    began_on = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # nth download waits for n delays at least, whichever worker it's from
+    started_on.sort()
+    for index, download_on in enumerate(started_on):
+        assert download_on - began_on >= index * 0.1 - 0.001
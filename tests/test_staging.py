@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from nautiluszim.staging import CLUSTER_SIZE, StagingArea, StagingClosedError
+
+
+def test_unbounded():
+    staging = StagingArea()
+    staging.reserve(2**40)
+    assert staging.used == 2**40
+    staging.release(2**40)
+    assert staging.used == 0
+    assert staging.peak == 2**40
+
+
+def test_reserve_blocks_until_released():
+    staging = StagingArea(budget=100)
+    staging.reserve(80)
+
+    timer = threading.Timer(0.2, staging.release, args=(80,))
+    timer.start()
+    start = time.monotonic()
+    staging.reserve(50)
+    assert time.monotonic() - start >= 0.15
+    assert staging.used == 50
+    assert staging.peak == 80
+
+
+def test_oversized_accepted_when_empty():
+    staging = StagingArea(budget=100)
+    staging.reserve(500)
+    assert staging.used == 500
+
+
+def test_stalled_goes_over_budget():
+    staging = StagingArea(budget=100, stall_timeout=0.1)
+    staging.reserve(80)
+    staging.reserve(50)
+    assert staging.used == 130
+
+
+def test_resize():
+    staging = StagingArea(budget=100)
+    staging.reserve(0)
+    staging.resize(0, 60)
+    assert staging.used == 60
+    staging.resize(60, 40)
+    assert staging.used == 40
+
+
+def test_resize_is_not_a_stall():
+    staging = StagingArea(budget=100, stall_timeout=0.3)
+    staging.reserve(80)
+
+    timer = threading.Timer(0.05, staging.resize, args=(80, 90))
+    timer.start()
+    release = threading.Timer(0.15, staging.release, args=(90,))
+    release.start()
+    staging.reserve(50)
+    assert staging.used == 50
+    assert staging.peak == 90
+
+
+def test_close_fails_pending_reserve():
+    staging = StagingArea(budget=100, stall_timeout=30)
+    staging.reserve(80)
+
+    timer = threading.Timer(0.1, staging.close)
+    timer.start()
+    start = time.monotonic()
+    with pytest.raises(StagingClosedError):
+        staging.reserve(50)
+    assert time.monotonic() - start < 5
+    with pytest.raises(StagingClosedError):
+        staging.reserve(0)
+
+
+def test_held_until_released():
+    staging = StagingArea(budget=3 * CLUSTER_SIZE, stall_timeout=5)
+    for _ in range(3):
+        staging.reserve(CLUSTER_SIZE)
+        staging.hand_over(CLUSTER_SIZE)
+
+    # more than open clusters may hold: libzim has some to write, we wait
+    timer = threading.Timer(0.1, staging.release, args=(CLUSTER_SIZE,))
+    timer.start()
+    start = time.monotonic()
+    staging.reserve(CLUSTER_SIZE)
+    assert 0.05 < time.monotonic() - start < 1
+    assert staging.held == 2 * CLUSTER_SIZE
+    assert staging.used == 3 * CLUSTER_SIZE
+
+
+def test_let_through_when_libzim_may_wait_for_more():
+    staging = StagingArea(budget=100, stall_timeout=30)
+    staging.reserve(80)
+    staging.hand_over(80)
+    start = time.monotonic()
+    staging.reserve(50)  # libzim's cluster is still open: nothing to release
+    assert time.monotonic() - start < 1
+    assert staging.used == 130
+
+    # one staged but not handed over yet: adding it may close the cluster
+    timer = threading.Timer(0.1, staging.hand_over, args=(50,))
+    timer.start()
+    start = time.monotonic()
+    staging.reserve(10)
+    assert time.monotonic() - start >= 0.05
+
+
+def test_large_held_file_does_not_block():
+    staging = StagingArea(budget=2**20, stall_timeout=30)
+    staging.reserve(2**30)
+    staging.hand_over(2**30)
+    staging.reserve(10)
+    staging.hand_over(10)
+    assert staging.open_clusters_bound == 2**30 + CLUSTER_SIZE
+    staging.release(2**30)
+    assert staging.held == staging.used == 10